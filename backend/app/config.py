@@ -1,5 +1,10 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from pathlib import Path
+
+# Same file main.py loads via load_dotenv — resolved absolutely so the .env is
+# found regardless of the working directory uvicorn was started from.
+_ENV_FILE = Path(__file__).resolve().parent.parent / ".env"
 
 class Settings(BaseSettings):
     # Supabase
@@ -20,10 +25,21 @@ class Settings(BaseSettings):
 
     # Tavily web search (optional — empty default allows startup without the key)
     tavily_api_key: str = ""
+
+    # Checkpointer Postgres pool (env: PG_POOL_MIN_SIZE / PG_POOL_MAX_SIZE)
+    pg_pool_min_size: int = 4
+    pg_pool_max_size: int = 25
+
+    # HNSW candidate list per match_chunks probe (env: HNSW_EF_SEARCH) — pgvector's
+    # default; raise for recall on heavily doc-scoped searches at some latency cost
+    hnsw_ef_search: int = 40
     
     class Config:
-        env_file = ".env"
+        env_file = _ENV_FILE
 
-@lru_cache()
+@lru_cache(maxsize=None)
 def get_settings():
+    # Single cached instance: the .env file is parsed and validated exactly once
+    # per process. Deliberately lazy (not a module-level Settings()) so importing
+    # app.config never fails before load_dotenv has populated os.environ.
     return Settings()
\ No newline at end of file
@@ -27,6 +27,8 @@ from app.graph.state import AgentState
 
 logger = logging.getLogger(__name__)
 
+_VALID_ACTIONS = frozenset({"summarize", "inquire", "compare", "audit"})
+
 
 # ---------------------------------------------------------------------------
 # Routing function — NOT a node, used by add_conditional_edges
@@ -39,8 +41,7 @@ def route_to_action(state: AgentState) -> str:
     Defaults to "inquire" if action is somehow unset — safe fallback.
     """
     action = state.get("action") or "inquire"
-    valid = {"summarize", "inquire", "compare", "audit"}
-    if action not in valid:
+    if action not in _VALID_ACTIONS:
         logger.warning("route_to_action | unexpected action=%r — defaulting to inquire", action)
         return "inquire"
     return action
@@ -55,6 +56,9 @@ def build_graph() -> StateGraph:
     """
     Return an uncompiled StateGraph with all nodes and edges registered.
     Compiled by graph_service.py with the PostgresSaver checkpointer.
+
+    Called exactly once per process — graph_service caches the compiled result,
+    so node/edge validation in .compile() never runs on the request path.
     """
     builder: StateGraph = StateGraph(AgentState)
 
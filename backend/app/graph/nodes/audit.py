@@ -22,22 +22,30 @@
 import logging
 
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from langsmith import traceable
 from langgraph.types import Command, interrupt
 
 from app.graph.state import CANCEL_SENTINEL, AgentState
-from app.graph.utils import rewrite_query
-from app.models.action_schemas import AuditResponse
+from app.graph.utils import build_user_context_line, rewrite_query
+from app.models.action_schemas import CITATIONS_ADAPTER, AuditResponse
 from app.services.llm_service import get_llm_service
-from app.services.retrieval_service import search_chunks, stratified_sample
+from app.services.retrieval_service import (
+    run_concurrently,
+    search_chunks,
+    search_chunks_many,
+    stratified_sample,
+)
 from app.services.supabase_client import get_supabase
 from app.services.theme_service import extract_themes
+from app.utils.tracing import traceable
 
 logger = logging.getLogger(__name__)
 
 # User text shorter than this uses single focused retrieval instead of theme extraction
 _SHORT_TEXT_THRESHOLD = 200
 
+# Gate 2: text-mode source shorter than this is treated as missing
+_MIN_SOURCE_TEXT_CHARS = 50
+
 
 # ---------------------------------------------------------------------------
 # Internal helpers
@@ -321,7 +329,9 @@ def audit_action(state: AgentState) -> dict | Command:
     # ── Step 2b: Text mode Gate 2 — validate source text ─────────────────────
     # Policy mode skips this entirely — source is the tagged document.
     if mode == "text":
-        if len(clean_query.strip()) < 50:
+        # clean_query is already mention-free and stripped by doc_resolver's TipTap
+        # walk, so a length check is O(1) — no regex/strip copy of a long paste.
+        if len(clean_query) < _MIN_SOURCE_TEXT_CHARS:
             logger.info("audit | Gate 2: source text missing or too short — interrupting")
             resume_val = interrupt({
                 "interrupt_type": "text_input",
@@ -422,16 +432,23 @@ def audit_action(state: AgentState) -> dict | Command:
     all_similarities: list[float] = []
 
     if is_multi_theme and themes:
+        # Themes rewrite independently — run together, then embed every theme
+        # query in one batch and search concurrently (search_chunks_many)
+        retrieval_queries = run_concurrently(
+            lambda theme: rewrite_query(theme, target_doc_titles, "audit").retrieval,
+            themes,
+        )
+        theme_results = search_chunks_many(
+            retrieval_queries,
+            user_id=user_id,
+            doc_ids=target_doc_ids,
+            k=5,
+            threshold=0.6,
+        )
+
+        # Dedupe in theme order so the first theme to surface a chunk still claims it
         seen_ids: set[str] = set()
-        for theme in themes:
-            retrieval_query = rewrite_query(theme, target_doc_titles, "audit").retrieval
-            result = search_chunks(
-                query_text=retrieval_query,
-                user_id=user_id,
-                doc_ids=target_doc_ids,
-                k=5,
-                threshold=0.6,
-            )
+        for theme, result in zip(themes, theme_results):
             for chunk in result["chunks"]:
                 if chunk["id"] not in seen_ids:
                     seen_ids.add(chunk["id"])
@@ -489,13 +506,7 @@ def audit_action(state: AgentState) -> dict | Command:
     )
 
     # ── Step 8: Build system prompt ───────────────────────────────────────────
-    user_context_line = ""
-    if user_industry or user_location:
-        ctx_parts = [p for p in [user_industry, user_location] if p]
-        user_context_line = (
-            f"\nUser context: Works in {' / '.join(ctx_parts)}. "
-            "Tailor regulatory references and examples to their jurisdiction."
-        )
+    user_context_line = build_user_context_line(user_industry, user_location)
 
     focus_line = (
         f"COMPLIANCE THEMES: {', '.join(themes)}"
@@ -545,7 +556,7 @@ def audit_action(state: AgentState) -> dict | Command:
 
     return {
         "response": final_response,
-        "citations": [c.model_dump() for c in parsed.citations],
+        "citations": CITATIONS_ADAPTER.dump_python(parsed.citations),
         "retrieved_chunks": regulatory_chunks,
         "retrieval_confidence": confidence_tier,
         "confidence_score": avg_similarity,
@@ -19,14 +19,15 @@ import logging
 from collections import defaultdict
 
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from langsmith import traceable
 
 from app.graph.state import AgentState
-from app.graph.utils import rewrite_query
-from app.models.action_schemas import CompareIntent, CompareResponse
+from app.graph.utils import build_user_context_line, rewrite_query
+from app.models.action_schemas import CITATIONS_ADAPTER, CompareIntent, CompareResponse
+from app.services.embedding_service import embed_query
 from app.services.llm_service import get_llm_service
-from app.services.retrieval_service import search_chunks, stratified_sample
+from app.services.retrieval_service import run_concurrently, search_chunks, stratified_sample
 from app.services.theme_service import extract_themes
+from app.utils.tracing import traceable
 
 logger = logging.getLogger(__name__)
 
@@ -281,14 +282,25 @@ def compare_action(state: AgentState) -> dict:
             search_topic[:60], retrieval_query[:80],
         )
 
-        for doc_id in resolved_doc_ids:
-            result = search_chunks(
+        # Independent per-doc searches — run together, merged in doc order.
+        # One query for every doc: embed it once up front so the concurrent
+        # searches all hit the memoised embedding instead of racing to embed it.
+        try:
+            embed_query(retrieval_query)
+        except Exception as e:
+            # Not fatal — each search_chunks retries the embed and degrades on its own
+            logger.warning("compare | query embedding warm-up failed: %s", e)
+        per_doc_results = run_concurrently(
+            lambda doc_id: search_chunks(
                 query_text=retrieval_query,
                 user_id=user_id,
                 doc_ids=[doc_id],
                 k=7,
                 threshold=0.5,
-            )
+            ),
+            resolved_doc_ids,
+        )
+        for result in per_doc_results:
             chunks.extend(result["chunks"])
 
         all_similarities = [c.get("similarity", 0.0) for c in chunks]
@@ -341,13 +353,7 @@ def compare_action(state: AgentState) -> dict:
     context_block = _build_compare_context(chunks, resolved_doc_ids, resolved_doc_titles, sort_by)
 
     # ── Step 6: Build mode-specific system prompt ─────────────────────────────
-    user_context_line = ""
-    if user_industry or user_location:
-        ctx_parts = [p for p in [user_industry, user_location] if p]
-        user_context_line = (
-            f"\nUser context: Works in {' / '.join(ctx_parts)}. "
-            "Tailor regulatory references and examples to their jurisdiction."
-        )
+    user_context_line = build_user_context_line(user_industry, user_location)
 
     if mode == "focused":
         # Build exact table header so the LLM uses real document titles as column names
@@ -392,7 +398,7 @@ def compare_action(state: AgentState) -> dict:
     # ── Step 9: Return state update ───────────────────────────────────────────
     return {
         "response": parsed.response,
-        "citations": [c.model_dump() for c in parsed.citations],
+        "citations": CITATIONS_ADAPTER.dump_python(parsed.citations),
         "retrieved_chunks": chunks,
         "retrieval_confidence": confidence_tier,
         "confidence_score": avg_similarity,
@@ -21,21 +21,23 @@
 
 import json
 import logging
-import uuid as _uuid_mod
+from functools import lru_cache
 from typing import Literal
 
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langgraph.types import Command, interrupt
 from pydantic import BaseModel, Field
-from rapidfuzz import fuzz, process
 
 from app.graph.state import CANCEL_SENTINEL, AgentState
+from app.graph.utils import is_uuid
+from app.services import document_cache
 from app.services.llm_service import get_llm_service
 from app.services.supabase_client import get_supabase
 
 logger = logging.getLogger(__name__)
 
 _FUZZY_THRESHOLD = 85  # WRatio score — empirically calibrated
+_USER_DOCS_LIMIT = 500  # newest-first cap on fuzzy candidates for very large libraries
 
 # ---------------------------------------------------------------------------
 # Pydantic schema for LLM structured output
@@ -48,6 +50,14 @@ _ACTION_HINTS: dict[str, str] = {
     "audit": "expects source text to audit + 1+ target regulation documents",
 }
 
+# Verb used in the doc_choice interrupt question ("Which document would you like to …?")
+_ACTION_VERBS: dict[str, str] = {
+    "summarize": "summarize",
+    "compare": "compare",
+    "audit": "audit against",
+    "inquire": "query",
+}
+
 _SYSTEM_PROMPT_TEMPLATE = """You are a document resolver for PolicyPal, a compliance document AI assistant.
 
 Your job: given the user's message, identify EVERY document they are referencing — both explicit @mentions and implicit references ("it", "that document", "the policy", "BankNegara", etc.).
@@ -100,7 +110,7 @@ class DocResolution(BaseModel):
 
 def _walk_tiptap(tiptap_json: dict) -> tuple[dict[str, str], str]:
     """
-    Recursively walk TipTap JSON.
+    Walk TipTap JSON depth-first with an explicit stack (no per-node recursion).
 
     Returns:
         doc_mentions: { uuid: label } for every document @mention found
@@ -109,7 +119,10 @@ def _walk_tiptap(tiptap_json: dict) -> tuple[dict[str, str], str]:
     doc_mentions: dict[str, str] = {}
     text_parts: list[str] = []
 
-    def _walk(node: dict) -> None:
+    stack = [tiptap_json]
+    pop, extend = stack.pop, stack.extend
+    while stack:
+        node = pop()
         node_type = node.get("type", "")
         if node_type == "mention":
             attrs = node.get("attrs") or {}
@@ -119,19 +132,25 @@ def _walk_tiptap(tiptap_json: dict) -> tuple[dict[str, str], str]:
                 if uid:
                     doc_mentions[uid] = label
             # Don't collect mention text as free text
-            return
+            continue
 
         if node_type == "text":
-            text = node.get("text", "")
-            text_parts.append(text)
+            text_parts.append(node.get("text", ""))
 
-        for child in node.get("content", []):
-            _walk(child)
+        # Children pushed reversed so they pop in document order (keeps text order)
+        extend(reversed(node.get("content") or ()))
 
-    _walk(tiptap_json)
     return doc_mentions, "".join(text_parts)
 
 
+def _append_unique(target: list[str], seen: set[str], uuids: list[str]) -> None:
+    """Append uuids not already in seen to target, in order. Mutates both."""
+    for uid in uuids:
+        if uid not in seen:
+            seen.add(uid)
+            target.append(uid)
+
+
 def _is_pure_mention(free_text: str) -> bool:
     """True if the message has no meaningful free text (only @mentions)."""
     return not free_text.strip()
@@ -143,7 +162,13 @@ def _is_pure_mention(free_text: str) -> bool:
 
 
 def _fetch_user_docs(user_id: str) -> list[dict]:
-    """Fetch all document id+title pairs for a user. Used for fuzzy matching."""
+    """
+    Fetch all document id+title pairs for a user. Used for fuzzy matching.
+    Served from a short TTL cache; failures are not cached so the next turn retries.
+    """
+    cached = document_cache.get_user_docs(user_id)
+    if cached is not None:
+        return cached
     try:
         resp = (
             get_supabase()
@@ -151,9 +176,13 @@ def _fetch_user_docs(user_id: str) -> list[dict]:
             .select("id, title")
             .eq("user_id", user_id)
             .eq("status", "ready")
+            .order("created_at", desc=True)
+            .limit(_USER_DOCS_LIMIT)
             .execute()
         )
-        return resp.data or []
+        docs = resp.data or []
+        document_cache.set_user_docs(user_id, docs)
+        return docs
     except Exception as e:
         logger.error("doc_resolver | Supabase fetch failed: %s", e)
         return []
@@ -172,26 +201,31 @@ def _fuzzy_match(
     if not all_docs or not unresolved_names:
         return [], unresolved_names
 
+    from rapidfuzz import fuzz, process  # deferred import: only needed when names are unresolved
+
     titles = [d["title"] for d in all_docs]
-    title_to_uuid = {d["title"]: d["id"] for d in all_docs}
 
     matched_uuids: list[str] = []
     still_unresolved: list[str] = []
 
     for name in unresolved_names:
-        result = process.extractOne(name, titles, scorer=fuzz.WRatio)
-        if result and result[1] >= _FUZZY_THRESHOLD:
-            matched_title = result[0]
-            matched_uuids.append(title_to_uuid[matched_title])
+        # score_cutoff lets rapidfuzz skip titles early once they can't reach the
+        # threshold; result[2] is the list index, so duplicate titles map correctly.
+        result = process.extractOne(
+            name, titles, scorer=fuzz.WRatio, score_cutoff=_FUZZY_THRESHOLD,
+        )
+        if result:
+            matched_title, score, idx = result
+            matched_uuids.append(all_docs[idx]["id"])
             logger.info(
                 "doc_resolver | fuzzy match: %r -> %r (score=%.1f)",
-                name, matched_title, result[1],
+                name, matched_title, score,
             )
         else:
             still_unresolved.append(name)
             logger.info(
-                "doc_resolver | fuzzy no-match: %r (best score=%.1f)",
-                name, result[1] if result else 0,
+                "doc_resolver | fuzzy no-match: %r (no title scored >= %d)",
+                name, _FUZZY_THRESHOLD,
             )
 
     return matched_uuids, still_unresolved
@@ -202,44 +236,62 @@ def _fuzzy_match(
 # ---------------------------------------------------------------------------
 
 
-def _build_llm_messages(
-    conversation_docs: dict[str, str],
-    explicit_uuids: list[str],
-    doc_mentions: dict[str, str],
+@lru_cache(maxsize=128)
+def _render_system_prompt(
     action: str,
-    latest_message: str,
-    context_messages: list,
-) -> list:
-    """Construct the messages list for the doc resolution LLM call."""
-    # Registry block — sorted for determinism
-    if conversation_docs:
-        registry_lines = [
-            f'- "{title}" -> UUID: {uuid}'
-            for title, uuid in sorted(conversation_docs.items())
-        ]
-        registry_block = "\n".join(registry_lines)
+    registry_items: tuple[tuple[str, str], ...],
+    explicit_items: tuple[tuple[str, str], ...],
+) -> str:
+    """
+    Render the resolver system prompt. Pure function of hashable inputs, so it is
+    memoized — the registry usually stays the same across many turns and retries.
+
+    registry_items: sorted (title, uuid) pairs
+    explicit_items: (uuid, display label) pairs in mention order
+    """
+    if registry_items:
+        registry_block = "\n".join(
+            f'- "{title}" -> UUID: {uuid}' for title, uuid in registry_items
+        )
     else:
         registry_block = "(empty — this is the user's first message, no prior documents)"
 
-    # Explicit block — prefer TipTap label (human-readable) over registry/UUID fallback
-    if explicit_uuids:
-        explicit_lines = [
-            f"- UUID: {uid} "
-            f'("{doc_mentions.get(uid) or next((t for t, u in conversation_docs.items() if u == uid), uid)}")'
-            for uid in explicit_uuids
-        ]
-        explicit_block = "\n".join(explicit_lines)
+    if explicit_items:
+        explicit_block = "\n".join(
+            f'- UUID: {uid} ("{label}")' for uid, label in explicit_items
+        )
     else:
         explicit_block = "(none)"
 
-    action_hint = _ACTION_HINTS.get(action, "")
-    system_content = _SYSTEM_PROMPT_TEMPLATE.format(
+    return _SYSTEM_PROMPT_TEMPLATE.format(
         registry_block=registry_block,
         action=action,
-        action_hint=action_hint,
+        action_hint=_ACTION_HINTS.get(action, ""),
         explicit_block=explicit_block,
     )
 
+
+def _build_llm_messages(
+    conversation_docs: dict[str, str],
+    uuid_to_title: dict[str, str],
+    explicit_uuids: list[str],
+    doc_mentions: dict[str, str],
+    action: str,
+    latest_message: str,
+    context_messages: list,
+) -> list:
+    """Construct the messages list for the doc resolution LLM call."""
+    # Registry sorted for determinism (and a stable cache key)
+    registry_items = tuple(sorted(conversation_docs.items()))
+
+    # Explicit labels — prefer TipTap label (human-readable) over registry/UUID fallback
+    explicit_items = tuple(
+        (uid, doc_mentions.get(uid) or uuid_to_title.get(uid, uid))
+        for uid in explicit_uuids
+    )
+
+    system_content = _render_system_prompt(action, registry_items, explicit_items)
+
     messages: list = [SystemMessage(content=system_content)]
     # Prepend context messages (last 5 from history) if available
     messages.extend(context_messages)
@@ -262,14 +314,15 @@ def doc_resolver(state: AgentState) -> dict:
     action = state.get("action") or "inquire"
     user_id = state.get("user_id") or ""
     messages = state.get("messages") or []
+    state_explicit_ids: list[str] = state.get("explicit_doc_ids") or []
 
     # ── Stage 1a: Extract explicit mentions from TipTap JSON ─────────────────
     doc_mentions, free_text = _walk_tiptap(tiptap_json)
     explicit_uuids = list(doc_mentions.keys())
 
     # Fallback: if tiptap_json was empty, use state's explicit_doc_ids
-    if not explicit_uuids and state.get("explicit_doc_ids"):
-        explicit_uuids = list(state["explicit_doc_ids"])
+    if not explicit_uuids and state_explicit_ids:
+        explicit_uuids = list(state_explicit_ids)
 
     logger.info(
         "doc_resolver | explicit_uuids=%s free_text=%r",
@@ -296,9 +349,11 @@ def doc_resolver(state: AgentState) -> dict:
 
     # ── Stage 1c: Determine context scope ─────────────────────────────────────
     # Registry hit → only latest message; pronoun/unknown → 5 messages of history
-    registry_keys_lower = {k.lower() for k in conversation_docs}
+    # Lowercase the message once; registry titles are lowered inline (a handful per
+    # conversation) rather than building a throwaway set on every call.
+    free_text_lower = free_text.lower()
     has_registry_hit = any(
-        key in free_text.lower() for key in registry_keys_lower
+        title.lower() in free_text_lower for title in conversation_docs
     )
 
     if has_registry_hit or not conversation_docs:
@@ -306,11 +361,9 @@ def doc_resolver(state: AgentState) -> dict:
         context_messages: list = []
         logger.info("doc_resolver | context=cheap (registry hit=%s)", has_registry_hit)
     else:
-        # History path: include last 5 non-system messages for disambiguation
-        context_messages = [
-            m for m in messages[-6:-1]
-            if not isinstance(m, SystemMessage)
-        ]
+        # History path: include last 5 messages for disambiguation. State only
+        # ever holds Human/AI messages (prompts are built per call), so no filter.
+        context_messages = messages[-6:-1]
         logger.info("doc_resolver | context=history (%d msgs)", len(context_messages))
 
     # Send full raw message to LLM — includes @mention labels so it can reason
@@ -320,9 +373,14 @@ def doc_resolver(state: AgentState) -> dict:
         str(messages[-1].content) if messages else free_text
     )
 
+    # Reverse registry {uuid: title} — built once, used by the prompt, the
+    # resolved_doc_titles map and the interrupt option labels below.
+    uuid_to_title = {v: k for k, v in conversation_docs.items()}
+
     # ── Stage 2: LLM call ─────────────────────────────────────────────────────
     llm_messages = _build_llm_messages(
         conversation_docs=conversation_docs,
+        uuid_to_title=uuid_to_title,
         explicit_uuids=explicit_uuids,
         doc_mentions=doc_mentions,
         action=action,
@@ -350,8 +408,12 @@ def doc_resolver(state: AgentState) -> dict:
         hallucinated = set(resolution.resolved_uuids) - set(validated_llm_uuids)
         logger.warning("doc_resolver | filtered hallucinated UUIDs: %s", hallucinated)
 
-    # Merge: explicit ∪ LLM-resolved (deduplicated)
-    merged_uuids = list(dict.fromkeys(explicit_uuids + validated_llm_uuids))
+    # Merge: explicit ∪ LLM-resolved (deduplicated, order-preserving).
+    # One ordered accumulator for every stage below instead of re-deduping each time.
+    merged_uuids: list[str] = []
+    seen_uuids: set[str] = set()
+    _append_unique(merged_uuids, seen_uuids, explicit_uuids)
+    _append_unique(merged_uuids, seen_uuids, validated_llm_uuids)
 
     # ── Stage 3: Fuzzy match for unresolved names ──────────────────────────────
     remaining_unresolved = resolution.unresolved_names
@@ -366,19 +428,18 @@ def doc_resolver(state: AgentState) -> dict:
         fuzzy_uuids, remaining_unresolved = _fuzzy_match(remaining_unresolved, all_docs)
 
         if fuzzy_uuids:
-            merged_uuids = list(dict.fromkeys(merged_uuids + fuzzy_uuids))
+            _append_unique(merged_uuids, seen_uuids, fuzzy_uuids)
             inference_source = "fuzzy_match"
             logger.info("doc_resolver | fuzzy added %d UUIDs", len(fuzzy_uuids))
 
     # Build {uuid: title} from data already in memory — zero extra DB calls.
     # Priority: TipTap label (current turn) → registry (history) → fuzzy DB fetch → UUID fallback.
     # Must run AFTER the fuzzy block so merged_uuids is fully populated.
-    _uuid_to_title = {v: k for k, v in conversation_docs.items()}
     _fuzzy_titles = {d["id"]: d["title"] for d in all_docs}
     resolved_doc_titles: dict[str, str] = {
         uid: (
             doc_mentions.get(uid)
-            or _uuid_to_title.get(uid)
+            or uuid_to_title.get(uid)
             or _fuzzy_titles.get(uid)
             or uid
         )
@@ -403,22 +464,18 @@ def doc_resolver(state: AgentState) -> dict:
     }
 
     # ── Stage 4: Interrupt gates ───────────────────────────────────────────────
-    # _uuid_to_title already built above for resolved_doc_titles; reused here.
+    # uuid_to_title already built above for the prompt; reused here.
 
     # Gate 1 — Medium confidence: multiple candidate docs, user must choose
     if resolution.inference_confidence == "medium" and suggested_doc_ids:
         options = []
         for uid in suggested_doc_ids:
             # doc_mentions has label from @mention; registry has historical title
-            label = doc_mentions.get(uid) or _uuid_to_title.get(uid) or uid
+            label = doc_mentions.get(uid) or uuid_to_title.get(uid) or uid
             options.append({"id": uid, "label": label})
         options.append({"id": "all", "label": "All of these"})
 
-        _action_verbs = {
-            "summarize": "summarize", "compare": "compare",
-            "audit": "audit against", "inquire": "query",
-        }
-        action_verb = _action_verbs.get(action, "use")
+        action_verb = _ACTION_VERBS.get(action, "use")
 
         logger.info(
             "doc_resolver | medium confidence — interrupting. candidates=%s",
@@ -441,10 +498,12 @@ def doc_resolver(state: AgentState) -> dict:
                 goto="format_response",
             )
 
-        if resume_val == "all":
-            final_ids = list(dict.fromkeys(merged_uuids + suggested_doc_ids))
-        else:
-            final_ids = list(dict.fromkeys(merged_uuids + [resume_val]))
+        # Copy first — merged_uuids is shared with base_result
+        final_ids = list(merged_uuids)
+        _append_unique(
+            final_ids, set(seen_uuids),
+            suggested_doc_ids if resume_val == "all" else [resume_val],
+        )
 
         logger.info("doc_resolver | doc_choice resume=%r → resolved=%s", resume_val, final_ids)
         return {**base_result, "resolved_doc_ids": final_ids, "inference_confidence": "high"}
@@ -475,15 +534,9 @@ def doc_resolver(state: AgentState) -> dict:
             )
 
         # Resume value should be a UUID from an @mention
-        is_valid_uuid = False
-        try:
-            _uuid_mod.UUID(str(resume_val))
-            is_valid_uuid = True
-        except (ValueError, AttributeError):
-            pass
-
-        if is_valid_uuid:
-            final_ids = list(dict.fromkeys(merged_uuids + [resume_val]))
+        if is_uuid(resume_val):
+            final_ids = list(merged_uuids)
+            _append_unique(final_ids, set(seen_uuids), [resume_val])
             logger.info("doc_resolver | text_input resume → added UUID=%s", resume_val)
             return {**base_result, "resolved_doc_ids": final_ids, "inference_confidence": "high"}
         else:
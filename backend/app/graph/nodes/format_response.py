@@ -11,11 +11,12 @@
 
 import logging
 
-from langchain_core.messages import AIMessage
-from langsmith import traceable
+from langchain_core.messages import AIMessage, HumanMessage
 
 from app.graph.state import AgentState
+from app.services import document_cache
 from app.services.supabase_client import get_supabase
+from app.utils.tracing import traceable
 
 logger = logging.getLogger(__name__)
 
@@ -23,22 +24,27 @@ logger = logging.getLogger(__name__)
 def _fetch_doc_titles(doc_ids: list[str]) -> dict[str, str]:
     """
     Fetch { title: uuid } pairs for the given document IDs.
-    Returns empty dict on empty input or Supabase error.
+    Served from the shared title cache; only uncached IDs hit Supabase.
+    Returns empty dict on empty input; cached hits only on Supabase error.
     """
     if not doc_ids:
         return {}
-    try:
-        resp = (
-            get_supabase()
-            .table("documents")
-            .select("id, title")
-            .in_("id", doc_ids)
-            .execute()
-        )
-        return {row["title"]: row["id"] for row in (resp.data or [])}
-    except Exception as e:
-        logger.error("format_response | Supabase title fetch failed: %s", e)
-        return {}
+    id_to_title, missing = document_cache.get_titles(doc_ids)
+    if missing:
+        try:
+            resp = (
+                get_supabase()
+                .table("documents")
+                .select("id,title")
+                .in_("id", missing)
+                .execute()
+            )
+            fetched = {row["id"]: row["title"] for row in (resp.data or [])}
+            document_cache.set_titles(fetched)
+            id_to_title.update(fetched)
+        except Exception as e:
+            logger.error("format_response | Supabase title fetch failed: %s", e)
+    return {title: uid for uid, title in id_to_title.items()}
 
 
 @traceable(run_type="chain", name="format_response")
@@ -49,32 +55,57 @@ def format_response(state: AgentState) -> dict:
     Returns partial state: { "conversation_docs": merged_registry, "messages": [updated_ai_msg] }
     The messages entry uses same-id replacement so the checkpoint has one AI message per turn.
     """
-    resolved_doc_ids: list[str] = state.get("resolved_doc_ids") or []
+    # Read-only inputs default to () — no throwaway list when the key is absent.
+    # conversation_docs keeps a real dict: it may be returned as the new registry.
+    resolved_doc_ids: list[str] = state.get("resolved_doc_ids") or ()
     existing_registry: dict[str, str] = state.get("conversation_docs") or {}
 
     # ── 1. Update conversation_docs registry ──────────────────────────────────
-    new_pairs = _fetch_doc_titles(resolved_doc_ids)
-    merged_registry = {**existing_registry, **new_pairs}
-
+    # doc_resolver already knows most titles (TipTap labels, registry, fuzzy fetch).
+    # Serve those from state and only hit Supabase for ids it couldn't name
+    # (set-expanded docs, interrupt resume picks) — usually zero round-trips.
+    known_titles: dict[str, str] = state.get("resolved_doc_titles") or {}
+    new_pairs: dict[str, str] = {}
+    missing_ids: list[str] = []
+    for uid in resolved_doc_ids:
+        title = known_titles.get(uid)
+        if title and title != uid:  # doc_resolver falls back to the UUID itself
+            new_pairs[title] = uid
+        else:
+            missing_ids.append(uid)
+    new_pairs.update(_fetch_doc_titles(missing_ids))
     if new_pairs:
-        logger.info(
-            "format_response | registry +%d entries (total %d): %s",
-            len(new_pairs), len(merged_registry), list(new_pairs.keys()),
-        )
+        merged_registry = existing_registry.copy()
+        merged_registry.update(new_pairs)
     else:
-        logger.info(
-            "format_response | no new docs (resolved_doc_ids=%s)", resolved_doc_ids,
-        )
+        # Nothing to add — hand back the existing registry without copying
+        merged_registry = existing_registry
+
+    # Guarded: the title list is materialised eagerly, unlike %-style args
+    if logger.isEnabledFor(logging.INFO):
+        if new_pairs:
+            logger.info(
+                "format_response | registry +%d entries (total %d): %s",
+                len(new_pairs), len(merged_registry), list(new_pairs.keys()),
+            )
+        else:
+            logger.info(
+                "format_response | no new docs (resolved_doc_ids=%s)", resolved_doc_ids,
+            )
 
     result: dict = {"conversation_docs": merged_registry}
 
     # ── 2. Inject retrieval metadata into the last AIMessage ──────────────────
-    # Find the last AIMessage written by the action node this turn.
+    # Find the last AIMessage written by the action node this turn. The scan stops
+    # at the turn's HumanMessage: it normally ends on the first element, and it can
+    # never walk into (and re-stamp) a previous turn's reply on long histories.
     last_ai_msg: AIMessage | None = None
-    for msg in reversed(state.get("messages") or []):
+    for msg in reversed(state.get("messages") or ()):
         if isinstance(msg, AIMessage):
             last_ai_msg = msg
             break
+        if isinstance(msg, HumanMessage):
+            break
 
     if last_ai_msg is None:
         # Cancel flow or stub node — no AIMessage to enrich, skip injection
@@ -91,7 +122,10 @@ def format_response(state: AgentState) -> dict:
         "action": state.get("action") or "inquire",
     }
 
-    # Clone with the SAME id → add_messages reducer replaces instead of appending
+    # Clone with the SAME id → add_messages reducer replaces instead of appending.
+    # model_copy is a shallow field copy that never re-runs validation, so this is
+    # already the cheap path for trusted data (equivalent to model_construct) —
+    # only the LLM reply itself is validated, upstream in invoke_structured.
     updated_ai_msg = last_ai_msg.model_copy(update={"additional_kwargs": updated_kwargs})
 
     logger.info(
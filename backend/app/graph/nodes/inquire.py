@@ -3,8 +3,9 @@
 # Pipeline:
 #   1. Read clean_query from state (set by doc_resolver); fallback to regex
 #   2. rewrite_query() — action-aware GPT-4o-mini query optimisation for retrieval
-#   3. Adaptive-k semantic retrieval (k=15, threshold=0.5, max 5 chunks/doc)
-#   4. Optional Tavily web search (if enable_web_search=True)
+#   3. Optional Tavily web search (if enable_web_search=True) — started on a
+#      worker thread so it overlaps with step 4
+#   4. Adaptive-k semantic retrieval (k=15, threshold=0.5, max 5 chunks/doc)
 #   5. Mode selection:
 #        Mode A     — doc chunks only          → strict context answer
 #        Mode A+Web — doc chunks + web results → strict docs + web synthesis
@@ -13,6 +14,9 @@
 #   6. GPT-4o-mini structured generation → InquireResponse (response + citations)
 #   7. Return state update with all retrieval + cost metadata
 #
+# Semantic cache: first-turn questions are embedded and probed against
+# services/semantic_cache before step 2; a hit returns the stored answer at $0.
+#
 # Conversation history: last 6 messages injected into the LLM call so the model
 # understands follow-up pronouns ("these regulations", "that policy", "it").
 # The system prompt explicitly instructs the LLM that history is context only —
@@ -21,21 +25,41 @@
 # The LLM receives the exact same [N] numbers used in context so citations
 # can be mapped back to source chunks/URLs by the frontend.
 
+import contextvars
 import logging
 import re
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from langsmith import traceable
 
 from app.graph.state import AgentState
-from app.graph.utils import rewrite_query, sanitize_history
-from app.models.action_schemas import InquireResponse
+from app.graph.utils import (
+    build_user_context_line,
+    last_human_message,
+    rewrite_query,
+    sanitize_history,
+)
+from app.models.action_schemas import CITATIONS_ADAPTER, InquireResponse
+from app.services import semantic_cache
+from app.services.embedding_service import embed_query
 from app.services.llm_service import get_llm_service
 from app.services.retrieval_service import search_chunks
 from app.services.tavily_service import web_search as tavily_search
+from app.utils.tracing import traceable
 
 logger = logging.getLogger(__name__)
 
+# Runs Tavily concurrently with pgvector retrieval (one web call per turn)
+_WEB_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="inquire-web")
+
+# @mention token stripper for the _extract_query fallback
+_MENTION_RE = re.compile(r"@\S+")
+
+# Cosine similarity for a semantic cache hit. Deliberately tighter than generic
+# paraphrase thresholds: two different questions about the same regulation
+# routinely score ~0.85 with text-embedding-3-small.
+_CACHE_SIMILARITY = 0.92
+
 # ---------------------------------------------------------------------------
 # System prompt templates
 # ---------------------------------------------------------------------------
@@ -144,17 +168,15 @@ _HISTORY_NOTE = (
 # ---------------------------------------------------------------------------
 
 
-def _extract_query(messages: list) -> str:
+def _extract_query(text: str) -> str:
     """
-    Fallback query extractor — strips @mention tokens from the last HumanMessage.
+    Fallback query extractor — strips @mention tokens from the last human message text.
     Used only when clean_query is absent from state (e.g. empty tiptap_json).
     Note: regex is imprecise for multi-word mentions; replaced by TipTap walk in doc_resolver.
     """
-    for msg in reversed(messages):
-        if isinstance(msg, HumanMessage):
-            text = msg.content if isinstance(msg.content, str) else str(msg.content)
-            return re.sub(r"@\S+", "", text).strip() or text
-    return ""
+    if "@" not in text:  # C-level substring scan — skip the regex when there are no mentions
+        return text.strip() or text
+    return _MENTION_RE.sub("", text).strip() or text
 
 
 def _get_history_window(messages: list, n: int = 6) -> list:
@@ -195,27 +217,29 @@ def _build_context_block(chunks: list[dict], web_results: list[dict]) -> str:
     Document chunks:  [N] Source: {title} | Page: {page} | DocID: {uuid}
     Web results:      [N] Source: {title} (web) | URL: {url}
     """
+    # Fragments are accumulated flat and joined once — no per-entry f-string
+    # intermediates for chunk bodies that can be 1-2kB each.
     parts: list[str] = []
-    n = 1
-
-    for chunk in chunks:
-        page_str = str(chunk["page"]) if chunk.get("page") is not None else "N/A"
-        parts.append(
-            f'[{n}] Source: {chunk.get("doc_title", "Unknown")} | Page: {page_str}'
-            f' | DocID: {chunk["document_id"]}\n'
-            f'"{chunk["content"]}"'
-        )
-        n += 1
+    extend = parts.extend
+    n = 0
 
-    for result in web_results:
-        parts.append(
-            f'[{n}] Source: {result.get("title", "Web Source")} (web)'
-            f' | URL: {result.get("url", "")}\n'
-            f'"{result.get("content", "")}"'
-        )
-        n += 1
+    for n, chunk in enumerate(chunks, 1):
+        page = chunk.get("page")
+        extend((
+            "[", str(n), "] Source: ", str(chunk.get("doc_title", "Unknown")),
+            " | Page: ", "N/A" if page is None else str(page),
+            " | DocID: ", str(chunk["document_id"]), '\n"', chunk["content"], '"\n\n',
+        ))
+
+    for n, result in enumerate(web_results, n + 1):
+        extend((
+            "[", str(n), "] Source: ", str(result.get("title", "Web Source")), " (web)",
+            " | URL: ", str(result.get("url", "")), '\n"', str(result.get("content", "")), '"\n\n',
+        ))
 
-    return "\n\n".join(parts)
+    if parts:
+        parts[-1] = '"'  # no separator after the final entry
+    return "".join(parts)
 
 
 # ---------------------------------------------------------------------------
@@ -242,15 +266,44 @@ def inquire_action(state: AgentState) -> dict:
     user_industry: str = state.get("user_industry") or ""
     user_location: str = state.get("user_location") or ""
 
+    # Current turn's raw text — found once, used for the query fallback and the LLM turn
+    last_human = last_human_message(messages)
+    last_human_content = str(last_human.content) if last_human else ""
+
     # ── Step 1: Get query ─────────────────────────────────────────────────────
     # Prefer clean_query from state (set by doc_resolver TipTap walk).
     # Fallback to regex for the rare case where tiptap_json was missing/empty.
-    query = state.get("clean_query") or _extract_query(messages)
+    query = state.get("clean_query") or _extract_query(last_human_content)
     logger.info(
         "inquire | query=%r docs=%d web=%s",
         query[:80], len(resolved_doc_ids), enable_web_search,
     )
 
+    # ── Step 1b: Semantic cache probe ─────────────────────────────────────────
+    # Only first-turn (history-free) questions are cacheable: with history, the
+    # rewrite and answer depend on prior turns, not just on the question text.
+    cache_scope: tuple | None = None
+    query_embedding: list[float] | None = None
+    if query and not _get_history_window(clean_messages, n=1):
+        cache_scope = (
+            user_id, tuple(sorted(resolved_doc_ids)), "inquire",
+            enable_web_search, user_industry, user_location,
+        )
+        try:
+            query_embedding = embed_query(query)
+            cached = semantic_cache.lookup(cache_scope, query_embedding, _CACHE_SIMILARITY)
+        except Exception as e:
+            logger.warning("inquire | semantic cache probe failed: %s — continuing uncached", e)
+            cache_scope, cached = None, None
+        if cached is not None:
+            logger.info("inquire | semantic cache hit — skipping rewrite/retrieval/LLM")
+            return {
+                **cached,
+                "tokens_used": 0,
+                "cost_usd": 0.0,
+                "messages": [AIMessage(content=cached["response"])],
+            }
+
     # ── Step 2: Optimise query for retrieval (+ web query when enabled) ───────
     # Passes conversation history so the rewriter resolves follow-up pronouns
     # ("these regulations", "that policy") into explicit terminology.
@@ -266,7 +319,24 @@ def inquire_action(state: AgentState) -> dict:
     retrieval_query = rewrite_result.retrieval
     logger.info("inquire | retrieval_query=%r", retrieval_query[:80])
 
-    # ── Step 3: Semantic retrieval ─────────────────────────────────────────────
+    # ── Step 3: Kick off optional web search (runs alongside retrieval) ───────
+    # Retrieval and Tavily both depend only on the rewrite, so the web call is
+    # started on a worker thread first and collected after retrieval returns —
+    # wall-clock becomes max(retrieval, web) instead of their sum.
+    web_results: list[dict] = []
+    web_search_query: str | None = None
+    web_future: Future | None = None
+
+    if enable_web_search:
+        # Use the Tavily-optimised query from the rewriter (real-world names,
+        # temporal context). Fall back to truncated retrieval query if absent.
+        web_search_query = rewrite_result.web or retrieval_query[:150]
+        # copy_context keeps the Tavily span nested under this node's LangSmith trace
+        web_future = _WEB_EXECUTOR.submit(
+            contextvars.copy_context().run, tavily_search, web_search_query,
+        )
+
+    # ── Step 4: Semantic retrieval ─────────────────────────────────────────────
     # Pass None for doc_ids when list is empty → search across ALL user docs
     retrieval = search_chunks(
         query_text=retrieval_query,
@@ -284,15 +354,8 @@ def inquire_action(state: AgentState) -> dict:
         len(chunks), confidence_tier, avg_similarity,
     )
 
-    # ── Step 4: Optional web search ───────────────────────────────────────────
-    web_results: list[dict] = []
-    web_search_query: str | None = None
-
-    if enable_web_search:
-        # Use the Tavily-optimised query from the rewriter (real-world names,
-        # temporal context). Fall back to truncated retrieval query if absent.
-        web_search_query = rewrite_result.web or retrieval_query[:150]
-        web_results = tavily_search(web_search_query)
+    if web_future is not None:
+        web_results = web_future.result()
         logger.info(
             "inquire | web search: query=%r → %d results",
             web_search_query[:60], len(web_results),
@@ -312,13 +375,7 @@ def inquire_action(state: AgentState) -> dict:
     #   Mode C     — docs resolved, no content     → content not found
     #   Mode B     — no docs + no content          → general knowledge answer
 
-    user_context_line = ""
-    if user_industry or user_location:
-        ctx_parts = [p for p in [user_industry, user_location] if p]
-        user_context_line = (
-            f"\nUser context: Works in {' / '.join(ctx_parts)}. "
-            "Tailor regulatory references and examples to their jurisdiction."
-        )
+    user_context_line = build_user_context_line(user_industry, user_location)
 
     has_content = len(chunks) > 0 or len(web_results) > 0
     has_web = len(web_results) > 0
@@ -351,7 +408,8 @@ def inquire_action(state: AgentState) -> dict:
     elif resolved_doc_ids:
         # Mode C — doc(s) were resolved but semantic search found nothing relevant.
         # Do NOT fall back to general knowledge — that would be misleading for compliance.
-        doc_titles_str = ", ".join(resolved_doc_titles.values()) if resolved_doc_titles else "the selected document(s)"
+        # Sorted so the prompt text is identical across turns (provider prefix caching)
+        doc_titles_str = ", ".join(sorted(resolved_doc_titles.values())) if resolved_doc_titles else "the selected document(s)"
         system_content = _SYSTEM_PROMPT_NO_CHUNKS.format(
             doc_titles=doc_titles_str,
             history_note=history_note,
@@ -360,7 +418,7 @@ def inquire_action(state: AgentState) -> dict:
         avg_similarity = 0.0
         logger.info(
             "inquire | mode=NOT_FOUND docs=%s history=%d",
-            list(resolved_doc_titles.values()), len(history_window),
+            doc_titles_str, len(history_window),
         )
 
     else:
@@ -377,12 +435,6 @@ def inquire_action(state: AgentState) -> dict:
     # Structure: [SystemMessage] → [...history (context only)] → [HumanMessage (current query)]
     # History helps the LLM resolve follow-up pronouns and conversation context.
     # The system prompt explicitly instructs the LLM that history is context, not the task.
-    last_human_content = ""
-    for msg in reversed(messages):
-        if isinstance(msg, HumanMessage):
-            last_human_content = msg.content if isinstance(msg.content, str) else str(msg.content)
-            break
-
     llm_messages = [
         SystemMessage(content=system_content),
         *history_window,
@@ -400,15 +452,21 @@ def inquire_action(state: AgentState) -> dict:
         llm_result.tokens_used, llm_result.cost_usd,
     )
 
-    return {
+    answer = {
         "response": parsed.response,
-        "citations": [c.model_dump() for c in parsed.citations],
+        "citations": CITATIONS_ADAPTER.dump_python(parsed.citations),
         "retrieved_chunks": chunks,
         "retrieval_confidence": confidence_tier,
         "confidence_score": avg_similarity,
-        "tokens_used": llm_result.tokens_used,
-        "cost_usd": llm_result.cost_usd,
         "web_search_results": web_results or None,
         "web_search_query": web_search_query,
+    }
+    if cache_scope is not None and query_embedding is not None:
+        semantic_cache.store(cache_scope, query_embedding, answer)
+
+    return {
+        **answer,
+        "tokens_used": llm_result.tokens_used,
+        "cost_usd": llm_result.cost_usd,
         "messages": [AIMessage(content=parsed.response)],
     }
@@ -3,8 +3,8 @@
 # Pipeline:
 #   Step 0: Explicit @Action tag from frontend → skip LLM entirely ($0)
 #   Step 1: Python keyword scan for temporal terms → enable_web_search flag (free)
-#   Step 2: First LLM pass with latest message only (cheap, fast)
-#   Step 3: Second LLM pass with 5-message context if low/medium confidence
+#   Step 2: First LLM pass with the last 3 messages (current + one prior exchange)
+#   Step 3: Second LLM pass with 5-message context only if confidence is low
 #   Step 4: "Summarize X about Y" override — specific topic queries → inquire
 #   Step 5: Interrupt gates (Phase 3)
 #             - multi_action_detected → action_choice interrupt (which action first?)
@@ -28,6 +28,7 @@ from langgraph.types import Command, interrupt
 from pydantic import BaseModel, Field
 
 from app.graph.state import CANCEL_SENTINEL, AgentState
+from app.graph.utils import last_human_message
 from app.services.llm_service import get_llm_service
 
 logger = logging.getLogger(__name__)
@@ -52,6 +53,49 @@ _SPECIFIC_TOPIC_RE = re.compile(
     re.IGNORECASE,
 )
 
+# ---------------------------------------------------------------------------
+# Classifier context window — prior AI replies trimmed
+# ---------------------------------------------------------------------------
+
+# Prior AI replies are cut to this many chars before classification — the topic
+# and action are clear from the opening; a full multi-paragraph answer would
+# dominate the classifier's input tokens on every follow-up
+_AI_PREFIX_CHARS = 300
+
+
+def _classifier_window(messages: list) -> list:
+    """Human messages as-is; AI messages trimmed to a short prefix."""
+    window = []
+    for msg in messages:
+        if isinstance(msg, AIMessage):
+            text = str(msg.content)
+            if len(text) > _AI_PREFIX_CHARS:
+                msg = AIMessage(content=text[:_AI_PREFIX_CHARS] + "…")
+        window.append(msg)
+    return window
+
+
+# ---------------------------------------------------------------------------
+# Interrupt gate constants — built once, shared by both action_choice gates
+# ---------------------------------------------------------------------------
+
+_ACTION_LABELS: dict[str, str] = {
+    "summarize": "Summarize",
+    "inquire": "Inquire",
+    "compare": "Compare",
+    "audit": "Audit",
+}
+
+# Full option list for the fallback / low-confidence gate — never mutated
+_ALL_ACTION_OPTIONS: list[dict[str, str]] = [
+    {"id": a, "label": l} for a, l in _ACTION_LABELS.items()
+]
+
+_CANCEL_MSG = (
+    "I wasn't sure which action to perform. "
+    "Try again using @Summarize, @Inquire, @Compare, or @Audit with your message."
+)
+
 # ---------------------------------------------------------------------------
 # Pydantic schema for LLM structured output
 # ---------------------------------------------------------------------------
@@ -113,11 +157,8 @@ def intent_resolver(state: AgentState) -> dict:
     frontend_web = state.get("enable_web_search", False)
 
     # Get last human message text for keyword scan + LLM prompt
-    last_message_text = ""
-    for msg in reversed(messages):
-        if isinstance(msg, HumanMessage):
-            last_message_text = str(msg.content)
-            break
+    last_human = last_human_message(messages)
+    last_message_text = str(last_human.content) if last_human else ""
 
     # ── Step 1: Python keyword scan (free, always runs) ──────────────────────
     python_web_flag = bool(_TEMPORAL_RE.search(last_message_text))
@@ -133,9 +174,16 @@ def intent_resolver(state: AgentState) -> dict:
             "enable_web_search": frontend_web or python_web_flag,
         }
 
-    # ── Step 2: First LLM pass (latest message only) ──────────────────────────
+    # ── Step 2: First LLM pass (last 3 messages) ─────────────────────────────
+    # Including the previous exchange up front lets most follow-ups classify in
+    # one call; previously every medium-confidence result paid for a second pass.
     llm = get_llm_service()
-    prompt = [SystemMessage(content=_SYSTEM_PROMPT), HumanMessage(content=last_message_text)]
+    # State only ever holds Human/AI messages — SystemMessages are built per call
+    recent = _classifier_window(messages[-3:])
+    prompt = [
+        SystemMessage(content=_SYSTEM_PROMPT),
+        *(recent or [HumanMessage(content=last_message_text)]),
+    ]
 
     classification = llm.invoke_structured("intent", IntentClassification, prompt).parsed
 
@@ -146,9 +194,9 @@ def intent_resolver(state: AgentState) -> dict:
         classification.reasoning[:120],
     )
 
-    # ── Step 3: Second pass with 5-message context (low/medium confidence) ────
-    if classification.confidence in ("low", "medium"):
-        last_5 = [m for m in messages[-6:] if not isinstance(m, SystemMessage)]
+    # ── Step 3: Second pass with 5-message context (low confidence only) ──────
+    if classification.confidence == "low":
+        last_5 = _classifier_window(messages[-6:])
         # Rebuild with richer context
         context_prompt = [SystemMessage(content=_SYSTEM_PROMPT), *last_5]
         classification = llm.invoke_structured("intent", IntentClassification, context_prompt).parsed
@@ -181,24 +229,16 @@ def intent_resolver(state: AgentState) -> dict:
     # interrupt() pauses on first call; returns resume_value on re-run.
     # Code after interrupt() only executes on the RESUME path.
 
-    _ACTION_LABELS = {
-        "summarize": "Summarize",
-        "inquire": "Inquire",
-        "compare": "Compare",
-        "audit": "Audit",
-    }
-
     # Gate 1 — Multi-action: user requested two actions simultaneously
     if classification.multi_action_detected:
-        valid = {"summarize", "inquire", "compare", "audit"}
         options = [
             {"id": a, "label": _ACTION_LABELS[a]}
             for a in classification.detected_actions
-            if a in valid
+            if a in _ACTION_LABELS
         ]
         # Fallback if LLM didn't populate detected_actions properly
         if len(options) < 2:
-            options = [{"id": a, "label": l} for a, l in _ACTION_LABELS.items()]
+            options = _ALL_ACTION_OPTIONS
 
         logger.info(
             "intent_resolver | multi_action_detected — interrupting for user choice. options=%s",
@@ -211,10 +251,7 @@ def intent_resolver(state: AgentState) -> dict:
         })
         # ── RESUME PATH ONLY ──────────────────────────────────────────────────
         if resume_val in (None, CANCEL_SENTINEL):
-            msg = (
-                "I wasn't sure which action to perform. "
-                "Try again using @Summarize, @Inquire, @Compare, or @Audit with your message."
-            )
+            msg = _CANCEL_MSG
             logger.info("intent_resolver | multi_action cancel → stopping with feedback")
             return Command(
                 update={"response": msg, "messages": [AIMessage(content=msg)]},
@@ -225,7 +262,7 @@ def intent_resolver(state: AgentState) -> dict:
 
     # Gate 2 — Low confidence: classifier uncertain after retry
     if classification.confidence == "low":
-        options = [{"id": a, "label": l} for a, l in _ACTION_LABELS.items()]
+        options = _ALL_ACTION_OPTIONS
         logger.info("intent_resolver | low confidence after retry — interrupting for user choice")
         resume_val = interrupt({
             "interrupt_type": "action_choice",
@@ -234,10 +271,7 @@ def intent_resolver(state: AgentState) -> dict:
         })
         # ── RESUME PATH ONLY ──────────────────────────────────────────────────
         if resume_val in (None, CANCEL_SENTINEL):
-            msg = (
-                "I wasn't sure which action to perform. "
-                "Try again using @Summarize, @Inquire, @Compare, or @Audit with your message."
-            )
+            msg = _CANCEL_MSG
             logger.info("intent_resolver | low_conf cancel → stopping with feedback")
             return Command(
                 update={"response": msg, "messages": [AIMessage(content=msg)]},
@@ -11,9 +11,10 @@
 
 import logging
 
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages import AIMessage
 
 from app.graph.state import AgentState
+from app.graph.utils import last_human_message
 
 logger = logging.getLogger(__name__)
 
@@ -29,16 +30,14 @@ def _build_stub_response(action: str, state: AgentState) -> dict:
 
     Returns a full partial-state dict ready to be returned from a graph node.
     """
-    messages = state.get("messages") or []
+    messages = state.get("messages") or ()
     resolved_doc_ids: list[str] = state.get("resolved_doc_ids") or []
     enable_web_search: bool = state.get("enable_web_search") or False
 
     # Latest human message text (fallback to empty string)
-    last_message = ""
-    for msg in reversed(messages):
-        if isinstance(msg, HumanMessage):
-            last_message = str(msg.content)
-            break
+    last_human = last_human_message(messages)
+    last_message = str(last_human.content) if last_human else ""
+    truncated = last_message[:200]
 
     doc_summary = (
         f"{len(resolved_doc_ids)} doc(s): {resolved_doc_ids}"
@@ -48,14 +47,14 @@ def _build_stub_response(action: str, state: AgentState) -> dict:
 
     response_parts = [
         f"[{action.upper()} — coming soon]",
-        f"Query: {last_message[:200]}",
+        f"Query: {truncated}",
         f"Resolved: {doc_summary}",
     ]
 
     # Web search stub note — real Tavily call added in future iteration
     web_search_query: str | None = None
     if enable_web_search:
-        web_search_query = last_message[:200]
+        web_search_query = truncated
         response_parts.append(
             f"[Web search would be performed here for: {web_search_query!r}]"
         )
@@ -18,12 +18,13 @@ import logging
 from collections import defaultdict
 
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from langsmith import traceable
 
 from app.graph.state import AgentState
-from app.models.action_schemas import SummarizeResponse
+from app.graph.utils import build_user_context_line
+from app.models.action_schemas import CITATIONS_ADAPTER, SummarizeResponse
 from app.services.llm_service import get_llm_service
 from app.services.retrieval_service import stratified_sample
+from app.utils.tracing import traceable
 
 logger = logging.getLogger(__name__)
 
@@ -172,13 +173,7 @@ def summarize_action(state: AgentState) -> dict:
         }
 
     # ── Step 3: Build system prompt ───────────────────────────────────────────
-    user_context_line = ""
-    if user_industry or user_location:
-        ctx_parts = [p for p in [user_industry, user_location] if p]
-        user_context_line = (
-            f"\nUser context: Works in {' / '.join(ctx_parts)}. "
-            "Tailor regulatory references and examples to their jurisdiction."
-        )
+    user_context_line = build_user_context_line(user_industry, user_location)
 
     system_content = _SYSTEM_PROMPT.format(
         context_block=context_block,
@@ -216,7 +211,7 @@ def summarize_action(state: AgentState) -> dict:
 
     return {
         "response": response,
-        "citations": [c.model_dump() for c in parsed.citations],
+        "citations": CITATIONS_ADAPTER.dump_python(parsed.citations),
         "retrieved_chunks": chunks,
         # Positional sampling always covers the full document — confidence is always high.
         # confidence_score is fixed at 1.0 (no cosine similarity from positional sampling).
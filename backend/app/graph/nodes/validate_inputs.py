@@ -15,12 +15,13 @@
 # determination requires a DB query that only audit_action performs.
 
 import logging
-import uuid as _uuid_mod
 
 from langchain_core.messages import AIMessage
 from langgraph.types import Command, interrupt
 
 from app.graph.state import CANCEL_SENTINEL, AgentState
+from app.graph.utils import is_uuid
+from app.services import document_cache
 from app.services.supabase_client import get_supabase
 
 logger = logging.getLogger(__name__)
@@ -33,20 +34,28 @@ _DOC_REQUIREMENTS: dict[str, int] = {
     "audit": 1,     # always needs 1+ target regulatory doc; source is doc or user text (checked in audit.py)
 }
 
+_EMPTY: tuple = ()
+
+# Actions that operate only on uploaded docs — web search is dropped for these
+_NO_WEB_ACTIONS = frozenset({"compare", "summarize", "audit"})
+
 
 def _fetch_set_doc_ids(set_id: str, user_id: str) -> list[str]:
     """Return all ready document IDs belonging to the given set and user."""
+
+    def _query() -> list[str]:
+        # RPC returns one text[] — no per-row dicts to decode and index.
+        # Served index-only by idx_documents_set_ready (partial on status='ready',
+        # keyed set_id, user_id INCLUDE id) — keep filters in step with that index.
+        resp = get_supabase().rpc(
+            "get_ready_doc_ids_for_set",
+            {"filter_set_id": set_id, "filter_user_id": user_id},
+        ).execute()
+        return list(resp.data or [])
+
     try:
-        resp = (
-            get_supabase()
-            .table("documents")
-            .select("id")
-            .eq("set_id", set_id)
-            .eq("user_id", user_id)
-            .eq("status", "ready")
-            .execute()
-        )
-        return [row["id"] for row in (resp.data or [])]
+        # 30s TTL + single-flight: interrupt resumes re-run this node and hit the cache
+        return document_cache.load_set_doc_ids(set_id, user_id, _query)
     except Exception as e:
         logger.error("validate_inputs | set_id fetch failed (set=%s): %s", set_id, e)
         return []
@@ -58,9 +67,22 @@ def validate_inputs(state: AgentState) -> dict:
     Returns partial state update (may be empty if nothing changed).
     """
     action = state.get("action") or "inquire"
-    resolved_doc_ids: list[str] = list(state.get("resolved_doc_ids") or [])
     enable_web_search: bool = state.get("enable_web_search") or False
     set_id: str | None = state.get("set_id")
+    # Read once, shared immutable default; copied to a list only when it grows
+    state_doc_ids = state.get("resolved_doc_ids") or _EMPTY
+    min_docs = _DOC_REQUIREMENTS.get(action, 0)
+
+    # ── Fast path: no set to expand, no flag to drop, doc count already met ───
+    # The common inquire turn lands here — nothing to change, nothing to gate.
+    if (
+        not set_id
+        and not (enable_web_search and action in _NO_WEB_ACTIONS)
+        and len(state_doc_ids) >= min_docs
+    ):
+        return {}
+
+    resolved_doc_ids: list[str] | tuple = state_doc_ids
     user_id: str = state.get("user_id") or ""
 
     result: dict = {}
@@ -69,18 +91,20 @@ def validate_inputs(state: AgentState) -> dict:
     if set_id and user_id:
         set_doc_ids = _fetch_set_doc_ids(set_id, user_id)
         if set_doc_ids:
-            merged = list(dict.fromkeys(resolved_doc_ids + set_doc_ids))
-            if merged != resolved_doc_ids:
+            # Order-preserving dedup: only the new ids are filtered and appended
+            seen = set(resolved_doc_ids)
+            added = [d for d in set_doc_ids if not (d in seen or seen.add(d))]
+            if added:
+                resolved_doc_ids = [*resolved_doc_ids, *added]
                 logger.info(
                     "validate_inputs | set_id=%s added %d docs -> total %d",
-                    set_id, len(set_doc_ids), len(merged),
+                    set_id, len(set_doc_ids), len(resolved_doc_ids),
                 )
-                resolved_doc_ids = merged
                 result["resolved_doc_ids"] = resolved_doc_ids
 
     # ── Web search cleanup ─────────────────────────────────────────────────────
     # These actions operate only on uploaded docs — web search is not applicable
-    if action in ("compare", "summarize", "audit") and enable_web_search:
+    if action in _NO_WEB_ACTIONS and enable_web_search:
         logger.info(
             "validate_inputs | %s + web_search=True -> dropping web search flag (not applicable)",
             action,
@@ -88,13 +112,14 @@ def validate_inputs(state: AgentState) -> dict:
         result["enable_web_search"] = False
 
     # ── Action-specific doc count validation ───────────────────────────────────
-    min_docs = _DOC_REQUIREMENTS.get(action, 0)
     actual_docs = len(resolved_doc_ids)
 
-    logger.info(
-        "validate_inputs | action=%s docs=%d/%d required",
-        action, actual_docs, min_docs,
-    )
+    # Per-run trace line — skip building the call entirely when INFO is off
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "validate_inputs | action=%s docs=%d/%d required",
+            action, actual_docs, min_docs,
+        )
 
     # ── Gate 1 — Insufficient documents for the action ────────────────────────
     if actual_docs < min_docs:
@@ -116,16 +141,10 @@ def validate_inputs(state: AgentState) -> dict:
         })
         # ── RESUME PATH ONLY ──────────────────────────────────────────────────
         if resume_val not in (None, CANCEL_SENTINEL):
-            is_valid_uuid = False
-            try:
-                _uuid_mod.UUID(str(resume_val))
-                is_valid_uuid = True
-            except (ValueError, AttributeError):
-                pass
-
-            if is_valid_uuid:
-                resolved_doc_ids = list(dict.fromkeys(resolved_doc_ids + [resume_val]))
-                result["resolved_doc_ids"] = resolved_doc_ids
+            if is_uuid(resume_val):
+                if resume_val not in resolved_doc_ids:
+                    resolved_doc_ids = [*resolved_doc_ids, resume_val]
+                    result["resolved_doc_ids"] = resolved_doc_ids
                 logger.info(
                     "validate_inputs | Gate 1 resume: added UUID=%s → total=%d docs",
                     resume_val, len(resolved_doc_ids),
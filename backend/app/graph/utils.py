@@ -1,5 +1,14 @@
 # Shared graph utilities:
 #
+# last_human_message(messages) — the current turn's HumanMessage (single reverse
+#   scan). Shared by intent_resolver, inquire_action and the stub actions.
+#
+# build_user_context_line(industry, location) — the "User context: ..." prompt
+#   line shared by all four action nodes (memoized; tiny input cardinality).
+#
+# is_uuid(value) — precompiled-regex check for interrupt resume values that
+#   should be a TipTap @mention UUID (doc_resolver, validate_inputs).
+#
 # sanitize_history(messages) — clean conversation history ONCE before it flows to
 #   any LLM. Called at the top of inquire_action; clean list is passed to both
 #   rewrite_query() and _get_history_window() so sanitization never runs twice.
@@ -16,18 +25,40 @@
 #   - When web_search=True (inquire), one LLM call produces BOTH queries.
 #   - Optional `messages` receives pre-sanitized history from inquire_action.
 #   - Falls back to clean_query / clean_query[:150] on any LLM failure.
+#   - Successful rewrites are cached for an hour, keyed on every prompt input
+#     (action, web flag, titles, history, query), so an interrupt resume that
+#     re-runs the action node skips the LLM call. Fallbacks are never cached.
 
 import logging
+import re
+import threading
+from functools import lru_cache
 from typing import NamedTuple
 
+from cachetools import TTLCache
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from langsmith import traceable
 from pydantic import BaseModel
 
 from app.services.llm_service import get_llm_service
+from app.utils.tracing import traceable
 
 logger = logging.getLogger(__name__)
 
+# Canonical hyphenated form — what TipTap mention ids carry
+_UUID_RE = re.compile(
+    r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+)
+
+# rewrite_query results: (action, web_search, titles_str, history_block, clean_query) → result.
+# Lock-guarded: action nodes run on LangGraph's thread pool.
+_REWRITE_CACHE: TTLCache = TTLCache(maxsize=2048, ttl=3600)
+_rewrite_cache_lock = threading.Lock()
+
+# Bounds on the DOCUMENTS line of rewrite prompts — a 200-doc set would otherwise
+# paste every title into the prompt, paying for each token on every rewrite.
+_PROMPT_TITLES_MAX_ITEMS = 30
+_PROMPT_TITLES_MAX_CHARS = 2000
+
 
 # ---------------------------------------------------------------------------
 # Public return type
@@ -137,10 +168,72 @@ _WEB_SYSTEM_PROMPT = (
 )
 
 
+# ---------------------------------------------------------------------------
+# Public helpers
+# ---------------------------------------------------------------------------
+
+def last_human_message(messages: list) -> HumanMessage | None:
+    """Return the most recent HumanMessage in messages, or None if there is none."""
+    # Fast path: before the action node runs, the current turn's message is last
+    if messages and isinstance(messages[-1], HumanMessage):
+        return messages[-1]
+    return next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+
+
+def is_uuid(value: object) -> bool:
+    """True if str(value) is a canonical UUID string (no exception-driven parsing)."""
+    return _UUID_RE.fullmatch(str(value)) is not None
+
+
+@lru_cache(maxsize=512)
+def build_user_context_line(industry: str, location: str) -> str:
+    """Profile-tailoring line appended to action prompts; "" when the profile is empty."""
+    ctx_parts = [p for p in (industry, location) if p]
+    if not ctx_parts:
+        return ""
+    return (
+        f"\nUser context: Works in {' / '.join(ctx_parts)}. "
+        "Tailor regulatory references and examples to their jurisdiction."
+    )
+
+
 # ---------------------------------------------------------------------------
 # Private helpers
 # ---------------------------------------------------------------------------
 
+@lru_cache(maxsize=512)
+def _render_system_prompt(
+    action: str, web_search: bool, titles_str: str, history_block: str
+) -> str:
+    """Formatted rewrite prompt — memoized since resumes re-run with identical inputs."""
+    template = (
+        _WEB_SYSTEM_PROMPT
+        if web_search
+        else _SYSTEM_PROMPTS.get(action, _DEFAULT_SYSTEM_PROMPT)
+    )
+    return template.format(titles=titles_str, history_block=history_block)
+
+
+def _titles_for_prompt(titles: list[str]) -> str:
+    """Comma-joined titles capped at _PROMPT_TITLES_MAX_ITEMS / _MAX_CHARS."""
+    if len(titles) <= _PROMPT_TITLES_MAX_ITEMS:
+        joined = ", ".join(titles)
+    else:
+        joined = (
+            ", ".join(titles[:_PROMPT_TITLES_MAX_ITEMS])
+            + f", … (+{len(titles) - _PROMPT_TITLES_MAX_ITEMS} more)"
+        )
+    if len(joined) > _PROMPT_TITLES_MAX_CHARS:
+        joined = joined[:_PROMPT_TITLES_MAX_CHARS - 3] + "..."
+    return joined
+
+
+def _cache_rewrite(cache_key: tuple | None, result: QueryRewriteResult) -> None:
+    if cache_key is not None:
+        with _rewrite_cache_lock:
+            _REWRITE_CACHE[cache_key] = result
+
+
 def _build_history_block(messages: list, n: int = 4) -> str:
     """Format up to N messages before the current query as readable context.
 
@@ -266,7 +359,7 @@ def rewrite_query(
         - web:       Tavily-optimised query, or None when web_search=False.
     """
     titles_str = (
-        ", ".join(doc_titles.values())
+        _titles_for_prompt(list(doc_titles.values()))
         if doc_titles
         else "(no specific document — general question)"
     )
@@ -282,13 +375,21 @@ def rewrite_query(
         else f"(no explicit question — generate queries for {action} on these documents)"
     )
 
+    # Empty queries are bypassed — the placeholder prompt isn't worth a slot
+    cache_key = (action, web_search, titles_str, history_block, clean_query) if clean_query else None
+    if cache_key is not None:
+        with _rewrite_cache_lock:
+            cached = _REWRITE_CACHE.get(cache_key)
+        if cached is not None:
+            logger.info("rewrite_query | cache hit action=%s web=%s", action, web_search)
+            return cached
+        logger.debug("rewrite_query | cache miss action=%s web=%s", action, web_search)
+
     llm = get_llm_service()
 
     # ── Web + retrieval path ───────────────────────────────────────────────
     if web_search:
-        system_content = _WEB_SYSTEM_PROMPT.format(
-            titles=titles_str, history_block=history_block
-        )
+        system_content = _render_system_prompt(action, True, titles_str, history_block)
         msg_list = [
             SystemMessage(content=system_content),
             HumanMessage(content=human_content),
@@ -301,7 +402,9 @@ def rewrite_query(
                 "rewrite_query | web=True action=%s | retrieval=%r web=%r",
                 action, retrieval[:80], web[:80],
             )
-            return QueryRewriteResult(retrieval=retrieval, web=web)
+            rewritten = QueryRewriteResult(retrieval=retrieval, web=web)
+            _cache_rewrite(cache_key, rewritten)
+            return rewritten
         except Exception as exc:
             logger.warning(
                 "rewrite_query | LLM failed (web path, action=%s) — falling back: %s",
@@ -310,8 +413,7 @@ def rewrite_query(
             return QueryRewriteResult(retrieval=clean_query, web=clean_query[:150])
 
     # ── Retrieval-only path ────────────────────────────────────────────────
-    template = _SYSTEM_PROMPTS.get(action, _DEFAULT_SYSTEM_PROMPT)
-    system_content = template.format(titles=titles_str, history_block=history_block)
+    system_content = _render_system_prompt(action, False, titles_str, history_block)
     msg_list = [
         SystemMessage(content=system_content),
         HumanMessage(content=human_content),
@@ -323,7 +425,9 @@ def rewrite_query(
             "rewrite_query | action=%s docs=%d | %r → %r",
             action, len(doc_titles), clean_query[:60], optimized[:80],
         )
-        return QueryRewriteResult(retrieval=optimized, web=None)
+        rewritten = QueryRewriteResult(retrieval=optimized, web=None)
+        _cache_rewrite(cache_key, rewritten)
+        return rewritten
     except Exception as exc:
         logger.warning(
             "rewrite_query | LLM failed (action=%s) — falling back to clean_query: %s",
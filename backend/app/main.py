@@ -1,6 +1,7 @@
 # load_dotenv() must be called before any app module imports so that
 # LANGSMITH_TRACING and other env vars are in os.environ when the SDK initialises.
 # Explicit path + override=True: works regardless of CWD and always wins over stale OS env vars.
+import asyncio
 import os
 import logging
 from pathlib import Path
@@ -34,11 +35,12 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.routers.chat import router as chat_router
 from app.routers.documents import router as documents_router
+from app.services.db_service import close_db_pool, get_db_pool
+from app.services.graph_service import get_compiled_graph
 
 app = FastAPI(title="PolicyPal API")
 
 
-@app.on_event("startup")
 def _verify_langsmith() -> None:
     """Validate LangSmith API key is set and reachable."""
     api_key = os.environ.get("LANGSMITH_API_KEY") or os.environ.get("LANGCHAIN_API_KEY")
@@ -56,6 +58,45 @@ def _verify_langsmith() -> None:
     except Exception as exc:
         _startup_logger.warning("LangSmith ✗ API check FAILED: %s", exc)
 
+
+# Strong ref so the background check isn't garbage-collected mid-flight
+_background_tasks: set[asyncio.Task] = set()
+
+
+@app.on_event("startup")
+async def _schedule_langsmith_check() -> None:
+    """Run the LangSmith check off the startup path — list_projects() is a blocking
+    HTTP call, and awaiting it would delay uvicorn serving by the LangSmith RTT."""
+    task = asyncio.create_task(asyncio.to_thread(_verify_langsmith))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+@app.on_event("startup")
+async def _warm_graph() -> None:
+    """Open the checkpointer pool and compile the graph before serving, so the first
+    chat doesn't pay for connection setup. A failure here is logged, not fatal —
+    get_compiled_graph() retries on the first request."""
+    try:
+        await get_compiled_graph()
+    except Exception as exc:
+        _startup_logger.warning("Graph warm-up FAILED — will retry on first request: %s", exc)
+
+
+@app.on_event("startup")
+async def _warm_db_pool() -> None:
+    """Open the retrieval pool before serving (sync pool — opened off the loop).
+    A failure is logged, not fatal; get_db_pool() retries on first retrieval."""
+    try:
+        await asyncio.to_thread(get_db_pool)
+    except Exception as exc:
+        _startup_logger.warning("Retrieval pool warm-up FAILED — will retry on first query: %s", exc)
+
+
+@app.on_event("shutdown")
+async def _close_db_pool() -> None:
+    await asyncio.to_thread(close_db_pool)
+
 # Allow Next.js frontend to call backend
 app.add_middleware(
     CORSMiddleware,
@@ -5,7 +5,7 @@
 
 from typing import Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 
 
 class Citation(BaseModel):
@@ -37,6 +37,11 @@ class Citation(BaseModel):
     )
 
 
+# Serializes a whole list[Citation] in one pydantic-core pass — action nodes use
+# CITATIONS_ADAPTER.dump_python(parsed.citations) instead of per-item model_dump().
+CITATIONS_ADAPTER: TypeAdapter[list[Citation]] = TypeAdapter(list[Citation])
+
+
 class InquireResponse(BaseModel):
     """Structured output for the Inquire action node."""
 
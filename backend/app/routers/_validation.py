@@ -0,0 +1,32 @@
+# Shared request-parameter validation for the chat and documents routers.
+#
+# validate_uuid runs 2-3x on every request (user_id, thread_id, document_id).
+# The frontend always sends canonical 36-char hyphenated UUIDs, so that shape is
+# checked with plain string ops; only values that fail it pay for uuid.UUID's
+# parse (which still accepts braces, urn: prefixes and unhyphenated hex).
+
+import uuid
+
+from fastapi import HTTPException
+
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+_HYPHEN_POSITIONS = (8, 13, 18, 23)
+
+
+def _is_canonical_uuid(value: str) -> bool:
+    return (
+        len(value) == 36
+        and value.count("-") == 4
+        and all(value[i] == "-" for i in _HYPHEN_POSITIONS)
+        and _HEX_DIGITS.issuperset(value.replace("-", ""))
+    )
+
+
+def validate_uuid(value: str, field_name: str) -> None:
+    """Raise 400 if value is not a valid UUID string."""
+    if _is_canonical_uuid(value):
+        return
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {field_name} format")
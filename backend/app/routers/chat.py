@@ -2,18 +2,21 @@
 # POST /chat        — streams graph.astream(stream_mode="updates") events + final ChatResponse
 # POST /chat/resume — streams graph.astream(Command(resume=value), ...) for PalAssist
 #
-# SSE format: each yield is one complete event line -> "data: {json}\n\n"
+# SSE format: each yield is one complete event line -> b"data: {json}\n\n"
+# (bytes — StreamingResponse passes them through without re-encoding)
 # Once streaming starts the status code is locked — errors after that point are
 # yielded as {"type": "error", "message": "..."} events, not HTTP error responses.
+#
+# Supabase calls are sync (supabase-py over httpx.Client) — endpoints run them via
+# asyncio.to_thread so one slow query never stalls every other open stream.
 
 import asyncio
-import json
 import logging
-import traceback
 import uuid
 from typing import Optional
 
 import langsmith as ls
+import orjson
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from langchain_core.messages import AIMessage, HumanMessage
@@ -32,8 +35,11 @@ from app.models.schemas import (
     StatusEvent,
 )
 from app.graph.state import CANCEL_SENTINEL
+from app.routers._validation import validate_uuid
+from app.services import document_cache
 from app.services.graph_service import get_compiled_graph
 from app.services.supabase_client import get_supabase
+from app.utils.tracing import tracing_enabled
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -50,13 +56,18 @@ def _make_graph_config(thread_id: str, run_name: str = "policypal-chat") -> dict
     """
     settings = get_settings()
     callbacks = []
-    if settings.langsmith_tracing.lower() == "true" and settings.langsmith_api_key:
+    if tracing_enabled() and settings.langsmith_api_key:
         callbacks.append(LangChainTracer(project_name=settings.langsmith_project))
     config: dict = {"configurable": {"thread_id": thread_id}, "run_name": run_name}
     if callbacks:
         config["callbacks"] = callbacks
     return config
 
+# Idle gap before a keepalive comment — under common proxy idle timeouts (30-60s).
+# The frontend parser (use-chat-stream.ts) already skips non-"data: " lines.
+_KEEPALIVE_SECONDS = 15.0
+_SSE_KEEPALIVE = b": keepalive\n\n"
+
 # SSE headers required for correct browser + proxy behaviour.
 # Content-Encoding: none prevents Next.js / Nginx from gzip-buffering the stream,
 # which would cause all events to arrive at once instead of incrementally.
@@ -69,52 +80,78 @@ _SSE_HEADERS = {
 }
 
 
-def _validate_uuid(value: str, field_name: str) -> None:
-    """Raise 400 if value is not a valid UUID string."""
-    try:
-        uuid.UUID(value)
-    except ValueError:
-        raise HTTPException(status_code=400, detail=f"Invalid {field_name} format")
+def _sse(event_model) -> bytes:
+    """Serialise a Pydantic model to an SSE data line.
+
+    Uses pydantic-core's serializer directly — same output as model_dump_json(),
+    but stays bytes end to end (no str decode here, no re-encode in Starlette).
+    """
+    return b"data: " + event_model.__pydantic_serializer__.to_json(event_model) + b"\n\n"
 
 
-def _sse(event_model) -> str:
-    """Serialise a Pydantic model to an SSE data line."""
-    return f"data: {event_model.model_dump_json()}\n\n"
+# State keys the terminal ChatResponse is built from — all plain overwrite channels
+_RESPONSE_KEYS = (
+    "response", "citations", "action", "inference_confidence",
+    "retrieval_confidence", "tokens_used", "cost_usd",
+)
+
+# Pre-rendered StatusEvent lines for the common no-enrichment case. NODE_STATUS_MAP
+# is static, so each line is built once through the real model — same escaping and
+# field order as _sse(StatusEvent(...)), none of the per-event construction.
+_PLAIN_STATUS_SSE: dict[str, bytes] = {
+    node: _sse(StatusEvent(node=node, message=message))
+    for node, message in NODE_STATUS_MAP.items()
+}
 
 
-def _sse_error(message: str) -> str:
+def _sse_error(message: str) -> bytes:
     """Serialise a plain error message to an SSE data line."""
-    return f"data: {json.dumps({'type': 'error', 'message': message})}\n\n"
+    return b"data: " + orjson.dumps({"type": "error", "message": message}) + b"\n\n"
 
 
-def _get_doc_titles_for_status(doc_ids: list[str], user_id: str) -> list[dict]:
+def _fetch_status_titles(doc_ids: list[str], user_id: str) -> dict[str, str]:
+    """Blocking Supabase read of {id: title} for doc_ids owned by user_id."""
+    result = (
+        get_supabase()
+        .table("documents")
+        .select("id, title")
+        .in_("id", doc_ids)
+        .eq("user_id", user_id)
+        .execute()
+    )
+    return {row["id"]: row["title"] for row in (result.data or [])}
+
+
+async def _get_doc_titles_for_status(doc_ids: list[str], user_id: str) -> list[dict]:
     """
-    Query document titles for the resolved doc IDs.
+    Look up document titles for the resolved doc IDs.
     Returns [{"id": uuid, "title": name}] for StatusEvent docs_found enrichment.
-    Silently returns [] on error — status enrichment is best-effort, not critical.
+    Served from the shared title cache; misses are fetched in one batched query on a
+    worker thread so the event loop keeps streaming.
+    Silently returns cache hits only on error — status enrichment is best-effort.
     """
     if not doc_ids:
         return []
-    try:
-        supabase = get_supabase()
-        result = (
-            supabase.table("documents")
-            .select("id, title")
-            .in_("id", doc_ids)
-            .eq("user_id", user_id)
-            .execute()
-        )
-        return [{"id": row["id"], "title": row["title"]} for row in (result.data or [])]
-    except Exception:
-        logger.warning("_get_doc_titles_for_status failed silently", exc_info=True)
-        return []
+    id_to_title, missing = document_cache.get_titles(doc_ids)
+    if missing:
+        try:
+            fetched = await asyncio.to_thread(_fetch_status_titles, missing, user_id)
+            document_cache.set_titles(fetched)
+            id_to_title.update(fetched)
+        except Exception:
+            logger.warning("_get_doc_titles_for_status failed silently", exc_info=True)
+    return [
+        {"id": doc_id, "title": id_to_title[doc_id]}
+        for doc_id in doc_ids
+        if doc_id in id_to_title
+    ]
 
 
 # ---------------------------------------------------------------------------
 # Shared SSE streaming generator
 # ---------------------------------------------------------------------------
 
-def _yield_interrupt(interrupt_val) -> str:
+def _yield_interrupt(interrupt_val) -> bytes:
     """
     Serialise an interrupt payload to an SSE InterruptResponse line.
 
@@ -159,10 +196,21 @@ async def _stream_graph(input_or_command, config: dict, user_id: str = ""):
     response_yielded = False
     settings = get_settings()
 
+    # Final-response fields tracked from the stream itself. A fresh /chat run starts
+    # from a full initial_state and every _RESPONSE_KEYS channel is last-write-wins,
+    # so initial values + streamed updates == final state — no checkpoint re-read.
+    # Resumes start mid-run (earlier writes aren't in this stream) and fall back to
+    # aget_state.
+    response_vals: dict | None = (
+        {k: input_or_command.get(k) for k in _RESPONSE_KEYS}
+        if isinstance(input_or_command, dict)
+        else None
+    )
+
     # tracing_context forces every graph run into LangSmith regardless of env-var
     # detection edge cases. This is the guaranteed path per LangSmith docs.
     with ls.tracing_context(
-        enabled=settings.langsmith_tracing.lower() == "true",
+        enabled=tracing_enabled(),
         project_name=settings.langsmith_project,
     ):
         try:
@@ -184,8 +232,15 @@ async def _stream_graph(input_or_command, config: dict, user_id: str = ""):
 
                 # ── Normal node update processing ────────────────────────────────
                 for node_name, updates in chunk.items():
-                    # Skip internal LangGraph bookkeeping nodes (e.g. __start__)
-                    if node_name not in NODE_STATUS_MAP:
+                    if response_vals is not None and updates:
+                        for key in _RESPONSE_KEYS:
+                            if key in updates:
+                                response_vals[key] = updates[key]
+
+                    # Skip internal LangGraph bookkeeping nodes (e.g. __start__) — the
+                    # pre-rendered status line doubles as the NODE_STATUS_MAP membership test
+                    plain_status = _PLAIN_STATUS_SSE.get(node_name)
+                    if plain_status is None:
                         continue
 
                     # Some nodes return None instead of a dict when they write no keys
@@ -193,29 +248,32 @@ async def _stream_graph(input_or_command, config: dict, user_id: str = ""):
                         updates = {}
 
                     # Emit a StatusEvent for every known node
-                    status = StatusEvent(
-                        node=node_name,
-                        message=NODE_STATUS_MAP[node_name],
-                        docs_found=None,
-                        web_query=None,
-                    )
-
+                    docs_found = None
                     # Enrich doc_resolver status with resolved document pills
                     if node_name == "doc_resolver":
                         resolved = updates.get("resolved_doc_ids") or []
                         if resolved and user_id:
-                            status.docs_found = _get_doc_titles_for_status(resolved, user_id)
+                            docs_found = await _get_doc_titles_for_status(resolved, user_id)
 
                     # Enrich any action node that performed web search
-                    if updates.get("web_search_query"):
-                        status.web_query = updates["web_search_query"]
-
-                    yield _sse(status)
+                    web_query = updates.get("web_search_query") or None
+
+                    if docs_found is None and web_query is None:
+                        yield plain_status
+                    else:
+                        yield _sse(StatusEvent(
+                            node=node_name,
+                            message=NODE_STATUS_MAP[node_name],
+                            docs_found=docs_found,
+                            web_query=web_query,
+                        ))
 
-                    # After format_response, read final state and emit ChatResponse
+                    # After format_response, emit ChatResponse from the final state
                     if node_name == "format_response":
-                        final_state = await graph.aget_state(config)
-                        vals = final_state.values
+                        if response_vals is not None:
+                            vals = response_vals
+                        else:
+                            vals = (await graph.aget_state(config)).values
                         yield _sse(ChatResponse(
                             response=vals.get("response") or "",
                             citations=vals.get("citations") or [],
@@ -257,13 +315,63 @@ async def _stream_graph(input_or_command, config: dict, user_id: str = ""):
             # user-initiated cancels stay green in traces.
             return
         except Exception as exc:
-            logger.error("Graph streaming error:\n%s", traceback.format_exc())
+            logger.exception(
+                "Graph streaming error, thread_id=%s",
+                config.get("configurable", {}).get("thread_id"),
+            )
             # Send a terminal error event to the client for good UX, then
             # re-raise so LangSmith correctly marks the run as failed.
             yield _sse_error(f"An error occurred: {str(exc)}")
             raise
 
 
+async def _with_keepalive(events, interval: float = _KEEPALIVE_SECONDS):
+    """
+    Relay an SSE generator, yielding an SSE comment whenever it has been silent
+    for `interval` seconds (a long LLM call inside one node) so proxies don't
+    close the idle connection. Browsers' EventSource ignores comment lines.
+
+    The source generator is drained by ONE producer task into a queue rather than
+    stepped from here with timeouts: _stream_graph holds ls.tracing_context (a
+    contextvar) across yields, which must enter and exit in the same task context.
+    The producer also closes the source itself (aclose in its finally), whether it
+    finished, failed or was cancelled mid-put.
+    Exceptions from the source are re-raised here after its queued events.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=8)
+    done = object()
+
+    async def _produce() -> None:
+        try:
+            async for event in events:
+                await queue.put(event)
+            await queue.put(done)
+        except Exception as exc:
+            await queue.put(exc)
+        finally:
+            # Cancelled while blocked on queue.put (slow client, full queue): close
+            # the source here, in this task — left suspended, it would be finalised
+            # later from another context, exiting tracing_context and astream there
+            await events.aclose()
+
+    producer = asyncio.create_task(_produce())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=interval)
+            except asyncio.TimeoutError:
+                yield _SSE_KEEPALIVE
+                continue
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Client disconnect / cancellation — stop the graph stream with us
+        producer.cancel()
+
+
 # ---------------------------------------------------------------------------
 # POST /chat
 # ---------------------------------------------------------------------------
@@ -279,8 +387,8 @@ async def chat(request: ChatRequest):
     Initial state includes all TRANSIENT fields (reset each turn).
     conversation_docs is intentionally EXCLUDED so the checkpoint registry persists.
     """
-    _validate_uuid(request.user_id, "user_id")
-    _validate_uuid(request.thread_id, "thread_id")
+    validate_uuid(request.user_id, "user_id")
+    validate_uuid(request.thread_id, "thread_id")
 
     # Fetch user profile for context injection into action node prompts.
     # One lightweight query per turn — action nodes tailor jurisdiction-specific answers.
@@ -288,13 +396,13 @@ async def chat(request: ChatRequest):
     user_industry = ""
     user_location = ""
     try:
-        profile_resp = (
+        profile_resp = await asyncio.to_thread(
             get_supabase()
             .from_("profiles")
             .select("industry, location")
             .eq("id", request.user_id)
             .single()
-            .execute()
+            .execute
         )
         if profile_resp.data:
             user_industry = profile_resp.data.get("industry") or ""
@@ -346,7 +454,7 @@ async def chat(request: ChatRequest):
     config = _make_graph_config(request.thread_id)
 
     return StreamingResponse(
-        _stream_graph(initial_state, config, user_id=request.user_id),
+        _with_keepalive(_stream_graph(initial_state, config, user_id=request.user_id)),
         headers=_SSE_HEADERS,
     )
 
@@ -370,8 +478,8 @@ async def resume_chat(request: ResumeRequest):
     Validation happens BEFORE the StreamingResponse — once streaming starts the
     status code is locked at 200 and errors can only be sent as SSE error events.
     """
-    _validate_uuid(request.user_id, "user_id")
-    _validate_uuid(request.thread_id, "thread_id")
+    validate_uuid(request.user_id, "user_id")
+    validate_uuid(request.thread_id, "thread_id")
 
     config = _make_graph_config(request.thread_id, run_name="policypal-resume")
 
@@ -395,7 +503,7 @@ async def resume_chat(request: ResumeRequest):
     command = Command(resume=CANCEL_SENTINEL if resume_val is None else resume_val)
 
     return StreamingResponse(
-        _stream_graph(command, config, user_id=request.user_id),
+        _with_keepalive(_stream_graph(command, config, user_id=request.user_id)),
         headers=_SSE_HEADERS,
     )
 
@@ -413,34 +521,37 @@ async def get_chat_history(thread_id: str, user_id: str):
     table needed. The checkpoint IS the source of truth for message history.
 
     user_id is injected as a query parameter by the Next.js proxy from the
-    Supabase session. We verify the conversation belongs to that user before
-    reading the checkpoint to prevent cross-user data access.
+    Supabase session. The ownership check and checkpoint read run concurrently
+    (independent round-trips); nothing from the checkpoint is returned until
+    ownership is confirmed, which prevents cross-user data access.
 
     Returns empty messages list for a thread with no checkpoint yet
     (new conversation that hasn't had a message sent yet).
     """
-    _validate_uuid(thread_id, "thread_id")
-    _validate_uuid(user_id, "user_id")
+    validate_uuid(thread_id, "thread_id")
+    validate_uuid(user_id, "user_id")
 
-    # Verify conversation ownership — thread_id == conversation.id in our schema
+    # Verify conversation ownership — thread_id == conversation.id in our schema —
+    # while reading checkpoint state (full message history via add_messages reducer).
+    # A wasted checkpoint read on a rejected request is cheap; those are rare.
     supabase = get_supabase()
-    ownership = (
-        supabase.table("conversations")
-        .select("id, user_id")
-        .eq("id", thread_id)
-        .single()
-        .execute()
+    graph = await get_compiled_graph()
+    config = {"configurable": {"thread_id": thread_id}}
+    ownership, state = await asyncio.gather(
+        asyncio.to_thread(
+            supabase.table("conversations")
+            .select("id, user_id")
+            .eq("id", thread_id)
+            .single()
+            .execute
+        ),
+        graph.aget_state(config),
     )
     if not ownership.data:
         raise HTTPException(status_code=404, detail="Conversation not found")
     if ownership.data["user_id"] != user_id:
         raise HTTPException(status_code=403, detail="Conversation does not belong to this user")
 
-    # Read checkpoint state — contains full message history via add_messages reducer
-    graph = await get_compiled_graph()
-    config = {"configurable": {"thread_id": thread_id}}
-    state = await graph.aget_state(config)
-
     # Empty state means no messages have been sent yet in this conversation
     raw_messages = (state.values or {}).get("messages", [])
 
@@ -5,15 +5,27 @@
 # Security: user_id is injected by the Next.js proxy from the Supabase session.
 # The backend validates it is a valid UUID and verifies document ownership.
 # The Supabase admin client bypasses RLS, so every query filters by user_id explicitly.
+# Supabase and storage calls are sync — each runs via asyncio.to_thread so an
+# ingest never blocks the event loop for other requests.
 
+import asyncio
+import hashlib
+import multiprocessing
+import os
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
 from typing import Optional
 
+from cachetools import TTLCache
 from fastapi import APIRouter, File, Form, HTTPException, UploadFile
 
 from app.models.schemas import DocType, DocumentStatus, IngestResponse, RetryResponse
-from app.services.embedding_service import embed_texts
-from app.services.processing_service import extract_and_chunk
+from app.routers._validation import validate_uuid
+from app.services import document_cache, retrieval_service, semantic_cache
+from app.services.embedding_service import aembed_texts
+from app.services.processing_service import MAX_PDF_BYTES, ChunkData, extract_and_chunk
 from app.services.storage_service import (
     delete_file,
     download_file,
@@ -24,15 +36,134 @@ from app.services.supabase_client import get_supabase
 
 router = APIRouter()
 
-MAX_FILE_SIZE = 20 * 1024 * 1024  # 20MB
+MAX_FILE_SIZE = MAX_PDF_BYTES  # 20MB
 
+# Chunk rows carry a 1536-float embedding (~12KB JSON each) — embed + insert in
+# slices so no single PostgREST body holds the whole document, a few in flight at once.
+_CHUNK_INSERT_BATCH = 200
+_CHUNK_INSERT_CONCURRENCY = 4
 
-def _validate_uuid(value: str, field_name: str) -> None:
-    """Raise 400 if value is not a valid UUID."""
+# Decimal places kept per embedding component in insert payloads. OpenAI returns
+# ~20-char float reprs; 6 places (error ≤ 5e-7 per component — negligible for
+# cosine ranking) roughly halves the JSON body per row.
+_EMBEDDING_DECIMALS = 6
+
+# PDF parsing is CPU-heavy and PDFium is not thread-safe — on a worker thread it
+# would contend with the event loop (and every open chat stream). Separate
+# processes parse in parallel, each with its own PDFium instance.
+# Workers are spawned, not forked: by first ingest this process already runs
+# executor, psycopg-pool and httpx threads, and a fork taken while one holds a
+# lock (e.g. logging's) could deadlock the child — and run_in_executor has no timeout.
+_EXTRACT_WORKERS = min(4, os.cpu_count() or 1)
+_EXTRACT_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+
+@lru_cache(maxsize=None)
+def _get_extract_pool() -> ProcessPoolExecutor:
+    # Created on first ingest, not at import — no idle worker processes per reload
+    return ProcessPoolExecutor(max_workers=_EXTRACT_WORKERS, mp_context=_EXTRACT_MP_CONTEXT)
+
+
+def _discard_extract_pool(pool: ProcessPoolExecutor) -> None:
+    # A worker that dies (PDFium segfault, OOM kill) marks the whole pool broken.
+    # Only clear the cache if it still holds this pool — a concurrent upload may
+    # already have replaced it.
+    if _get_extract_pool() is pool:
+        _get_extract_pool.cache_clear()
+    pool.shutdown(wait=False)
+
+
+async def _run_extract(file_bytes: bytes) -> list[ChunkData]:
+    """extract_and_chunk on the process pool, retried once on a fresh pool if
+    the current one is broken. A second BrokenProcessPool propagates."""
+    loop = asyncio.get_running_loop()
+    pool = _get_extract_pool()
     try:
-        uuid.UUID(value)
-    except ValueError:
-        raise HTTPException(status_code=400, detail=f"Invalid {field_name} format")
+        return await loop.run_in_executor(pool, extract_and_chunk, file_bytes)
+    except BrokenProcessPool:
+        _discard_extract_pool(pool)
+
+    pool = _get_extract_pool()
+    try:
+        return await loop.run_in_executor(pool, extract_and_chunk, file_bytes)
+    except BrokenProcessPool:
+        # Discard this one too — don't hand the next upload a dead pool
+        _discard_extract_pool(pool)
+        raise
+
+
+# Content hash → chunks, so re-uploading the same PDF (or retrying a document
+# whose embedding step failed) skips the parse. Chunk lists are read-only once
+# built. Only touched from the event loop thread, so no lock.
+_CHUNK_CACHE: TTLCache = TTLCache(maxsize=32, ttl=3600)
+
+
+def _content_key(file_bytes: bytes) -> str:
+    return hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+
+
+async def _extract_chunks(file_bytes: bytes) -> list[ChunkData]:
+    """Run extract_and_chunk in the extraction process pool (see _run_extract).
+    ValueErrors propagate (and are not cached)."""
+    # hashlib releases the GIL on large buffers — hash a 20MB upload off the loop
+    key = await asyncio.to_thread(_content_key, file_bytes)
+    chunks = _CHUNK_CACHE.get(key)
+    if chunks is None:
+        chunks = await _run_extract(file_bytes)
+        _CHUNK_CACHE[key] = chunks
+    return chunks
+
+
+async def _embed_and_store_chunks(
+    supabase, user_id: str, document_id: str, chunks: list[ChunkData]
+) -> None:
+    """
+    Embed and insert chunks as a pipeline of _CHUNK_INSERT_BATCH slices: each
+    slice is embedded then inserted on its own, up to _CHUNK_INSERT_CONCURRENCY
+    slices in flight, so later slices embed while earlier ones upload.
+    Slices are not atomic together — on any failure, slices not yet started are
+    skipped and, once every in-flight slice has settled, the document's chunks
+    are deleted before re-raising the first error, so a failed document never
+    leaves partial chunks visible to retrieval.
+    """
+    semaphore = asyncio.Semaphore(_CHUNK_INSERT_CONCURRENCY)
+    failed = asyncio.Event()
+
+    async def _process_slice(chunk_slice: list[ChunkData]) -> None:
+        async with semaphore:
+            if failed.is_set():
+                return  # document is being rolled back — don't embed/insert more
+            try:
+                embeddings = await aembed_texts([c.content for c in chunk_slice])
+                rows = [
+                    {
+                        "user_id": user_id,
+                        "document_id": document_id,
+                        "chunk_index": chunk.chunk_index,
+                        "page": chunk.page,
+                        "content": chunk.content,
+                        "embedding": [round(x, _EMBEDDING_DECIMALS) for x in embedding],
+                    }
+                    for chunk, embedding in zip(chunk_slice, embeddings)
+                ]
+                # Supabase client is sync — keep the upload off the event loop
+                await asyncio.to_thread(supabase.table("chunks").insert(rows).execute)
+            except BaseException:
+                failed.set()
+                raise
+
+    # return_exceptions: let every slice settle first — in-flight to_thread inserts
+    # can't be cancelled, so deleting on the first failure would race them
+    results = await asyncio.gather(*(
+        _process_slice(chunks[i : i + _CHUNK_INSERT_BATCH])
+        for i in range(0, len(chunks), _CHUNK_INSERT_BATCH)
+    ), return_exceptions=True)
+    error = next((r for r in results if isinstance(r, BaseException)), None)
+    if error is not None:
+        await asyncio.to_thread(
+            supabase.table("chunks").delete().eq("document_id", document_id).execute
+        )
+        raise error
 
 
 def _set_failed(document_id: str, error_message: str) -> None:
@@ -57,19 +188,29 @@ async def ingest_document(
     2. Create document record (status=processing)
     3. Upload PDF to Supabase Storage
     4. Extract text + chunk + embed
-    5. Save chunks atomically + mark status=ready
+    5. Insert chunks in batched slices (a failed slice rolls back the document's
+       chunks; document marked failed) + mark status=ready
     """
     # Validate user_id and optional set_id are valid UUIDs
-    _validate_uuid(user_id, "user_id")
+    validate_uuid(user_id, "user_id")
     if set_id:
-        _validate_uuid(set_id, "set_id")
+        validate_uuid(set_id, "set_id")
 
     # Validate file is a PDF
     if file.content_type not in ("application/pdf", "application/octet-stream"):
         if not (file.filename or "").lower().endswith(".pdf"):
             raise HTTPException(status_code=400, detail="Only PDF files are supported")
 
-    file_bytes = await file.read()
+    # Starlette has already spooled the upload to a temp file (disk past 1MB) and
+    # knows its size — reject oversize files before pulling anything into memory.
+    # The capped read covers clients that didn't report a size: it never buffers
+    # more than one byte past the limit.
+    if file.size is not None and file.size > MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=400, detail="File too large. Maximum size is 20MB"
+        )
+
+    file_bytes = await file.read(MAX_FILE_SIZE + 1)
 
     if len(file_bytes) > MAX_FILE_SIZE:
         raise HTTPException(
@@ -84,7 +225,7 @@ async def ingest_document(
     storage_path = f"{user_id}/{document_id}/{original_filename}"
 
     # Step 1: Create document record with status=processing
-    supabase.table("documents").insert(
+    await asyncio.to_thread(supabase.table("documents").insert(
         {
             "id": document_id,
             "user_id": user_id,
@@ -97,13 +238,17 @@ async def ingest_document(
             "original_filename": original_filename,
             "chunk_count": 0,
         }
-    ).execute()
+    ).execute)
 
     # Step 2: Upload PDF to Supabase Storage
     try:
-        upload_file(supabase, file_bytes, user_id, document_id, original_filename)
+        await asyncio.to_thread(
+            upload_file, supabase, file_bytes, user_id, document_id, original_filename
+        )
     except Exception:
-        _set_failed(document_id, "Failed to upload file to storage. Please try again.")
+        await asyncio.to_thread(
+            _set_failed, document_id, "Failed to upload file to storage. Please try again."
+        )
         return IngestResponse(
             document_id=document_id,
             status=DocumentStatus.failed,
@@ -112,29 +257,17 @@ async def ingest_document(
 
     # Steps 3-6: Extract, chunk, embed, save
     try:
-        chunks = extract_and_chunk(file_bytes)
-        texts = [c.content for c in chunks]
-        embeddings = embed_texts(texts)
-
-        chunk_records = [
-            {
-                "user_id": user_id,
-                "document_id": document_id,
-                "chunk_index": chunk.chunk_index,
-                "page": chunk.page,
-                "content": chunk.content,
-                "embedding": embedding,
-            }
-            for chunk, embedding in zip(chunks, embeddings)
-        ]
-
-        # Insert all chunks in one batch (atomic at the API level)
-        supabase.table("chunks").insert(chunk_records).execute()
+        chunks = await _extract_chunks(file_bytes)
+
+        await _embed_and_store_chunks(supabase, user_id, document_id, chunks)
 
         # Mark document as ready
-        supabase.table("documents").update(
+        await asyncio.to_thread(supabase.table("documents").update(
             {"status": "ready", "chunk_count": len(chunks)}
-        ).eq("id", document_id).execute()
+        ).eq("id", document_id).execute)
+        document_cache.invalidate_user(user_id)
+        retrieval_service.invalidate_user(user_id)
+        semantic_cache.invalidate_user(user_id)
 
         return IngestResponse(
             document_id=document_id,
@@ -146,7 +279,7 @@ async def ingest_document(
     except ValueError as e:
         # User-fixable errors (empty PDF, scanned PDF, etc.)
         error_msg = str(e)
-        _set_failed(document_id, error_msg)
+        await asyncio.to_thread(_set_failed, document_id, error_msg)
         return IngestResponse(
             document_id=document_id,
             status=DocumentStatus.failed,
@@ -154,7 +287,8 @@ async def ingest_document(
         )
 
     except Exception:
-        _set_failed(
+        await asyncio.to_thread(
+            _set_failed,
             document_id,
             "Processing failed. Please try again or check that the PDF contains readable text.",
         )
@@ -171,18 +305,18 @@ async def retry_document(document_id: str, user_id: str = Form(...)):
     Re-process a failed document using its already-stored PDF file.
     No re-upload needed — downloads from Supabase Storage and re-runs the pipeline.
     """
-    _validate_uuid(user_id, "user_id")
-    _validate_uuid(document_id, "document_id")
+    validate_uuid(user_id, "user_id")
+    validate_uuid(document_id, "document_id")
 
     supabase = get_supabase()
 
     # Fetch document and verify ownership + status
-    result = (
+    result = await asyncio.to_thread(
         supabase.table("documents")
         .select("id, user_id, status, storage_path, original_filename")
         .eq("id", document_id)
         .single()
-        .execute()
+        .execute
     )
 
     if not result.data:
@@ -202,43 +336,32 @@ async def retry_document(document_id: str, user_id: str = Form(...)):
     storage_path = doc["storage_path"]
 
     # Check file exists in storage before marking as processing
-    if not file_exists(supabase, user_id, document_id):
+    if not await asyncio.to_thread(file_exists, supabase, user_id, document_id):
         raise HTTPException(
             status_code=404,
             detail="Original file not available in storage. Please delete this document and re-upload.",
         )
 
     # Mark as processing so UI shows shimmer immediately
-    supabase.table("documents").update(
+    await asyncio.to_thread(supabase.table("documents").update(
         {"status": "processing", "error_message": None}
-    ).eq("id", document_id).execute()
+    ).eq("id", document_id).execute)
 
     # Delete any partial chunks from previous attempt
-    supabase.table("chunks").delete().eq("document_id", document_id).execute()
+    await asyncio.to_thread(supabase.table("chunks").delete().eq("document_id", document_id).execute)
 
     # Re-process from stored file
     try:
-        file_bytes = download_file(supabase, storage_path)
-        chunks = extract_and_chunk(file_bytes)
-        texts = [c.content for c in chunks]
-        embeddings = embed_texts(texts)
-
-        chunk_records = [
-            {
-                "user_id": user_id,
-                "document_id": document_id,
-                "chunk_index": chunk.chunk_index,
-                "page": chunk.page,
-                "content": chunk.content,
-                "embedding": embedding,
-            }
-            for chunk, embedding in zip(chunks, embeddings)
-        ]
-
-        supabase.table("chunks").insert(chunk_records).execute()
-        supabase.table("documents").update(
+        file_bytes = await asyncio.to_thread(download_file, supabase, storage_path)
+        chunks = await _extract_chunks(file_bytes)
+
+        await _embed_and_store_chunks(supabase, user_id, document_id, chunks)
+        await asyncio.to_thread(supabase.table("documents").update(
             {"status": "ready", "chunk_count": len(chunks)}
-        ).eq("id", document_id).execute()
+        ).eq("id", document_id).execute)
+        document_cache.invalidate_user(user_id)
+        retrieval_service.invalidate_user(user_id)
+        semantic_cache.invalidate_user(user_id)
 
         return RetryResponse(
             document_id=document_id,
@@ -249,7 +372,7 @@ async def retry_document(document_id: str, user_id: str = Form(...)):
 
     except ValueError as e:
         error_msg = str(e)
-        _set_failed(document_id, error_msg)
+        await asyncio.to_thread(_set_failed, document_id, error_msg)
         return RetryResponse(
             document_id=document_id,
             status=DocumentStatus.failed,
@@ -257,7 +380,8 @@ async def retry_document(document_id: str, user_id: str = Form(...)):
         )
 
     except Exception:
-        _set_failed(
+        await asyncio.to_thread(
+            _set_failed,
             document_id,
             "Reprocessing failed. Please try again or check that the PDF contains readable text.",
         )
@@ -0,0 +1,89 @@
+# Direct Postgres access for hot-path retrieval reads.
+#
+# match_chunks / match_chunks_batch / stratified_sample_chunks are plain SQL
+# functions; calling them over PostgREST adds an HTTPS hop, JSON encode/decode
+# on both sides and the REST gateway's own latency to every retrieval. This
+# module runs them on a pooled psycopg connection instead. Everything else
+# (auth, storage, writes) stays on the Supabase client.
+#
+# Sync pool: retrieval runs inside sync graph nodes on LangGraph's thread pool.
+# Same DSN and connection rules as graph_service's checkpointer pool:
+#   settings.database_url → Supabase transaction pooler (port 6543)
+#   prepare_threshold=None disables prepared statements — the pooler shares
+#   physical connections, so server-side prepared statements would collide.
+#
+# Like get_supabase(), this connects as a privileged role (no RLS) — every
+# query MUST filter by user_id explicitly.
+
+import logging
+import threading
+
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_POOL_MIN_SIZE = 2
+_POOL_MAX_SIZE = 10
+_POOL_TIMEOUT_SECONDS = 5.0
+_POOL_OPEN_TIMEOUT_SECONDS = 10.0
+
+# Module-level singleton, same shape as graph_service's pool. The lock stops a
+# cold-start retrieval fan-out (up to 8 threads) from each opening its own pool
+# and leaking all but one.
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_db_pool() -> ConnectionPool:
+    """Process-wide pool, opened on first use (main.py warms it at startup).
+    A failed open is not kept — the next call tries again."""
+    global _pool
+    # Fast path — already open
+    if _pool is not None:
+        return _pool
+
+    with _pool_lock:
+        # Re-check inside lock — another thread may have opened it while we waited
+        if _pool is not None:
+            return _pool
+        pool = ConnectionPool(
+            conninfo=get_settings().database_url,
+            min_size=_POOL_MIN_SIZE,
+            max_size=_POOL_MAX_SIZE,
+            timeout=_POOL_TIMEOUT_SECONDS,
+            # The transaction pooler drops idle TCP — replace stale connections on checkout
+            check=ConnectionPool.check_connection,
+            open=False,
+            kwargs={
+                "autocommit": True,
+                "prepare_threshold": None,
+                "row_factory": dict_row,
+            },
+        )
+        try:
+            pool.open(wait=True, timeout=_POOL_OPEN_TIMEOUT_SECONDS)
+        except Exception:
+            pool.close()
+            raise
+        _pool = pool
+        logger.info("db_service | retrieval connection pool ready")
+    return _pool
+
+
+def close_db_pool() -> None:
+    """Close the pool if it was opened (main.py shutdown hook)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+        logger.info("db_service | retrieval connection pool closed")
+
+
+def fetch_all(query: str, params: dict) -> list[dict]:
+    """Run one read query on a pooled connection and return its rows as dicts."""
+    with get_db_pool().connection() as conn:
+        return conn.execute(query, params).fetchall()
@@ -0,0 +1,105 @@
+# Process-local TTL caches for document metadata read on the chat path.
+#
+#   user docs — doc_resolver's fuzzy stage needs the user's full ready-document
+#               list; it changes rarely but would otherwise cost a Supabase
+#               round-trip on every unresolved turn.
+#   titles    — doc_id → title, read by format_response on nearly every turn.
+#   set docs  — (set_id, user_id) → ready doc ids, read by validate_inputs on
+#               every set-mention turn and again on each interrupt resume.
+#               Loads are single-flight: concurrent misses for the same key
+#               wait on the first caller's query instead of issuing their own.
+#
+# Freshness: the ingest/retry routes invalidate a user's entry when a document
+# becomes ready. Renames/deletes happen browser → Supabase directly (bypassing
+# this backend), so the short TTL is what bounds staleness for those.
+#
+# Sync graph nodes run on LangGraph's thread pool — TTLCache isn't thread-safe,
+# so every access goes through the lock.
+
+import threading
+from typing import Callable
+
+from cachetools import TTLCache
+
+_USER_DOCS_TTL_SECONDS = 30
+_TITLES_TTL_SECONDS = 600
+_SET_DOCS_TTL_SECONDS = 30
+
+_user_docs: TTLCache = TTLCache(maxsize=1024, ttl=_USER_DOCS_TTL_SECONDS)
+_titles: TTLCache = TTLCache(maxsize=4096, ttl=_TITLES_TTL_SECONDS)
+_set_docs: TTLCache = TTLCache(maxsize=1024, ttl=_SET_DOCS_TTL_SECONDS)
+# (set_id, user_id) → Event set when the in-progress load finishes
+_set_docs_inflight: dict[tuple[str, str], threading.Event] = {}
+_lock = threading.Lock()
+
+
+def get_user_docs(user_id: str) -> list[dict] | None:
+    """Cached [{id, title}] ready-document list for a user, or None on miss."""
+    with _lock:
+        return _user_docs.get(user_id)
+
+
+def set_user_docs(user_id: str, docs: list[dict]) -> None:
+    with _lock:
+        _user_docs[user_id] = docs
+
+
+def invalidate_user(user_id: str) -> None:
+    """Drop a user's cached document list and set expansions (call when their documents change)."""
+    with _lock:
+        _user_docs.pop(user_id, None)
+        for key in [k for k in _set_docs if k[1] == user_id]:
+            _set_docs.pop(key, None)
+
+
+def get_titles(doc_ids: list[str]) -> tuple[dict[str, str], list[str]]:
+    """Split doc_ids into ({doc_id: title} cache hits, [ids to fetch])."""
+    hits: dict[str, str] = {}
+    missing: list[str] = []
+    with _lock:
+        for doc_id in doc_ids:
+            title = _titles.get(doc_id)
+            if title is None:
+                missing.append(doc_id)
+            else:
+                hits[doc_id] = title
+    return hits, missing
+
+
+def set_titles(id_to_title: dict[str, str]) -> None:
+    with _lock:
+        _titles.update(id_to_title)
+
+
+def load_set_doc_ids(
+    set_id: str, user_id: str, loader: Callable[[], list[str]]
+) -> list[str]:
+    """
+    Cached ready doc ids for a set. On miss, exactly one caller runs loader();
+    concurrent callers for the same key wait for it. Exceptions from loader
+    propagate and nothing is cached, so a failed lookup is retried next time.
+    """
+    key = (set_id, user_id)
+    while True:
+        with _lock:
+            cached = _set_docs.get(key)
+            if cached is not None:
+                return cached
+            event = _set_docs_inflight.get(key)
+            if event is None:
+                event = threading.Event()
+                _set_docs_inflight[key] = event
+                break
+        # Another thread is loading this key — wait, then re-check the cache
+        # (it stays empty if that load failed, and this caller takes over).
+        event.wait()
+
+    try:
+        doc_ids = loader()
+        with _lock:
+            _set_docs[key] = doc_ids
+        return doc_ids
+    finally:
+        with _lock:
+            _set_docs_inflight.pop(key, None)
+        event.set()
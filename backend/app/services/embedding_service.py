@@ -1,29 +1,127 @@
 # OpenAI embedding service.
 # Wraps text-embedding-3-small with batching to handle large documents.
-# Batch size of 2000 stays within OpenAI's per-request limit.
+# Batches are packed greedily up to MAX_BATCH_ITEMS inputs or MAX_BATCH_TOKENS
+# (approximated as len(text) // 4), whichever comes first — OpenAI caps a
+# request at 2048 inputs and 300K tokens, and long chunks hit the token cap
+# well before the item cap.
+#
+#   embed_texts(texts)        — sync; graph nodes on the thread pool
+#   embed_query(text)         — sync single query, memoised (exact text, LRU) — a
+#                               repeated question or cached rewrite skips the API call
+#   await aembed_texts(texts) — async; ingest/retry routes. Batches are sent
+#                               concurrently (bounded by _MAX_CONCURRENT_BATCHES)
+#                               so a large document costs ~1 RTT, not one per batch.
+#
+# One client per process for each flavour (lru_cache) — pooled keep-alive
+# connections instead of a fresh TLS handshake per call. Both run HTTP/2 (h2), so
+# aembed_texts' concurrent batches multiplex over one connection.
 
-from openai import OpenAI
+import asyncio
+from array import array
+from functools import lru_cache
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
 
 from app.config import get_settings
 
 MODEL = "text-embedding-3-small"
-BATCH_SIZE = 2000
+MAX_BATCH_ITEMS = 2048
+MAX_BATCH_TOKENS = 280_000  # headroom under the 300K cap for the chars/4 estimate
+
+# Concurrent embedding requests per aembed_texts call — stays well inside rate limits
+_MAX_CONCURRENT_BATCHES = 4
+
+# Query embeddings memoised per process. Stored as packed doubles (~12KB each vs
+# ~50KB as a float list), so the full cache stays around 6MB.
+_QUERY_CACHE_SIZE = 512
+
+_HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+
+
+@lru_cache(maxsize=None)
+def _get_client() -> OpenAI:
+    # Default*HttpxClient keeps the SDK's own timeout/redirect defaults
+    return OpenAI(
+        api_key=get_settings().openai_api_key,
+        http_client=DefaultHttpxClient(http2=True, limits=_HTTP_LIMITS),
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_async_client() -> AsyncOpenAI:
+    return AsyncOpenAI(
+        api_key=get_settings().openai_api_key,
+        http_client=DefaultAsyncHttpxClient(http2=True, limits=_HTTP_LIMITS),
+    )
+
+
+def _ordered_embeddings(response) -> list[list[float]]:
+    # Sort by index to guarantee order matches input
+    return [item.embedding for item in sorted(response.data, key=lambda x: x.index)]
+
+
+def _batches(texts: list[str]) -> list[list[str]]:
+    """Split texts into contiguous batches within MAX_BATCH_ITEMS / MAX_BATCH_TOKENS."""
+    if len(texts) <= MAX_BATCH_ITEMS and sum(map(len, texts)) // 4 <= MAX_BATCH_TOKENS:
+        return [texts] if texts else []
+
+    batches: list[list[str]] = []
+    start, batch_tokens = 0, 0
+    for i, text in enumerate(texts):
+        tokens = len(text) // 4
+        if i > start and (i - start >= MAX_BATCH_ITEMS or batch_tokens + tokens > MAX_BATCH_TOKENS):
+            batches.append(texts[start:i])
+            start, batch_tokens = i, 0
+        batch_tokens += tokens
+    batches.append(texts[start:])
+    return batches
 
 
 def embed_texts(texts: list[str]) -> list[list[float]]:
     """
     Generate embeddings for a list of texts using OpenAI text-embedding-3-small.
-    Batches requests for documents with >2000 chunks.
+    Batches requests for large documents (see _batches).
     Returns a list of 1536-dimensional float vectors in the same order as input.
     """
-    client = OpenAI(api_key=get_settings().openai_api_key)
+    client = _get_client()
     all_embeddings: list[list[float]] = []
 
-    for i in range(0, len(texts), BATCH_SIZE):
-        batch = texts[i : i + BATCH_SIZE]
+    for batch in _batches(texts):
         response = client.embeddings.create(model=MODEL, input=batch)
-        # Sort by index to guarantee order matches input
-        sorted_data = sorted(response.data, key=lambda x: x.index)
-        all_embeddings.extend([item.embedding for item in sorted_data])
+        all_embeddings.extend(_ordered_embeddings(response))
 
     return all_embeddings
+
+
+@lru_cache(maxsize=_QUERY_CACHE_SIZE)
+def _embed_query_cached(text: str) -> array:
+    # lru_cache does not store exceptions — a failed call is retried next time
+    return array("d", embed_texts([text])[0])
+
+
+def embed_query(text: str) -> list[float]:
+    """
+    Embedding for a single query string, served from an in-process LRU when the
+    exact text was embedded recently. Returns a fresh list (safe to mutate).
+    """
+    return _embed_query_cached(text).tolist()
+
+
+async def aembed_texts(texts: list[str]) -> list[list[float]]:
+    """
+    Async embed_texts — batches run concurrently, results returned in input order.
+    """
+    client = _get_async_client()
+    semaphore = asyncio.Semaphore(_MAX_CONCURRENT_BATCHES)
+
+    async def _embed_batch(batch: list[str]) -> list[list[float]]:
+        async with semaphore:
+            response = await client.embeddings.create(model=MODEL, input=batch)
+        return _ordered_embeddings(response)
+
+    # gather preserves argument order, so batch results line up with their offsets
+    batch_results = await asyncio.gather(
+        *(_embed_batch(batch) for batch in _batches(texts))
+    )
+    return [embedding for batch in batch_results for embedding in batch]
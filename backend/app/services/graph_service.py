@@ -3,13 +3,20 @@
 # Uses AsyncPostgresSaver + AsyncConnectionPool so every checkpoint operation
 # (aget_state, astream) works inside FastAPI's async event loop without blocking.
 #
-# Lazy init: first request to get_compiled_graph() bootstraps the pool,
-# runs setup(), and compiles the graph. All subsequent calls return instantly.
+# Init: main.py's startup hook calls get_compiled_graph() so the pool, setup()
+# and compile happen before the first request; if that fails, the first request
+# retries the same lazy path. All subsequent calls return instantly.
 #
 # Connection note:
 #   settings.database_url → Supabase transaction pooler (port 6543)
 #   prepare_threshold=None disables prepared statements — required because
 #   the pooler shares physical connections; prepared statements collide.
+#
+# Pool sizing: min_size connections are opened up front so the first chats
+# after startup don't pay connection setup; max_size bounds concurrent
+# checkpointing streams. An acquire that waits longer than _POOL_TIMEOUT_SECONDS
+# fails fast instead of hanging the request. Checkpoint writes already batch
+# their statements through psycopg pipeline mode inside AsyncPostgresSaver.
 
 from __future__ import annotations
 
@@ -29,6 +36,9 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+_POOL_TIMEOUT_SECONDS = 5.0
+_POOL_OPEN_TIMEOUT_SECONDS = 10.0
+
 # Module-level singletons — created once per process, reused across requests
 _pool: AsyncConnectionPool | None = None
 _compiled_graph: "CompiledStateGraph | None" = None
@@ -42,9 +52,14 @@ async def _get_pool() -> AsyncConnectionPool:
         settings = get_settings()
         logger.info("Initializing async Postgres connection pool...")
         # open=False defers connection opening until pool.open() is awaited below
-        _pool = AsyncConnectionPool(
+        pool = AsyncConnectionPool(
             conninfo=settings.database_url,
-            max_size=10,
+            min_size=settings.pg_pool_min_size,
+            max_size=settings.pg_pool_max_size,
+            timeout=_POOL_TIMEOUT_SECONDS,
+            # Liveness check on checkout — the transaction pooler drops idle TCP,
+            # so a stale connection is replaced instead of failing the checkpoint op
+            check=AsyncConnectionPool.check_connection,
             open=False,
             kwargs={
                 "autocommit": True,         # Required by AsyncPostgresSaver
@@ -52,7 +67,13 @@ async def _get_pool() -> AsyncConnectionPool:
                 "row_factory": dict_row,    # Checkpointer reads rows by column name
             },
         )
-        await _pool.open()
+        # wait=True: return only once min_size connections are established
+        try:
+            await pool.open(wait=True, timeout=_POOL_OPEN_TIMEOUT_SECONDS)
+        except Exception:
+            await pool.close()
+            raise
+        _pool = pool
         logger.info("Async connection pool ready.")
     return _pool
 
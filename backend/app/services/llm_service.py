@@ -11,20 +11,37 @@
 #     (multi-theme synthesis + legal risk analysis — highest stakes / quality)
 #
 # One ChatOpenAI instance is created per model name and reused across all
-# calls (connection pooling, avoids repeated client init overhead).
+# calls. Both share one sync + one async httpx client (HTTP/2), so gpt-4o and
+# gpt-4o-mini calls reuse the same keep-alive connections to api.openai.com.
+#
+# Retries: rate limits (429), connection errors/timeouts, 409 conflicts and 5xx
+# server errors — the transient failures the SDK's own retries covered — are
+# retried up to _MAX_ATTEMPTS times with exponential backoff + jitter (tenacity),
+# honouring Retry-After when OpenAI sends one. Other API errors are wrapped in
+# RuntimeError immediately.
 
 import asyncio
 import logging
-import time
 from typing import Any, NamedTuple, Type, TypeVar
 
+import httpx
 import openai
 from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.runnables import Runnable
 from langchain_openai import ChatOpenAI
-from langsmith import traceable
+from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
 from pydantic import BaseModel
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    Retrying,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
 
 from app.config import get_settings
+from app.utils.tracing import traceable
 
 logger = logging.getLogger(__name__)
 
@@ -56,11 +73,68 @@ _ACTION_TO_MODEL: dict[str, str] = {
     "audit": "gpt-4o-mini",               # legal risk analysis — highest stakes
 }
 
-# USD per token — used for per-call cost logging
-_COST_PER_TOKEN: dict[str, dict[str, float]] = {
-    "gpt-4o":      {"input": 5.00 / 1_000_000,  "output": 15.00 / 1_000_000},
-    "gpt-4o-mini": {"input": 0.15 / 1_000_000,  "output":  0.60 / 1_000_000},
+# (input, output) US cents per million tokens — used for per-call cost logging.
+# Integer rates: cost is one int multiply-add per call, converted to USD once.
+_PRICING_CENTS_PER_MTOK: dict[str, tuple[int, int]] = {
+    "gpt-4o":      (500, 1500),
+    "gpt-4o-mini": (15,  60),
 }
+_CENTS_PER_MTOK_TO_USD = 100 * 1_000_000
+_NO_PRICING = (0, 0)
+
+_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+# APIConnectionError covers APITimeoutError; InternalServerError is any 5xx
+_RETRYABLE = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.ConflictError,
+    openai.InternalServerError,
+)
+_MAX_ATTEMPTS = 5
+_MAX_BACKOFF_SECONDS = 30.0
+_backoff = wait_exponential_jitter(initial=1, max=_MAX_BACKOFF_SECONDS)
+
+
+def _retry_wait(retry_state: RetryCallState) -> float:
+    """Server-provided Retry-After (capped) when present, else exponential jitter."""
+    exc = retry_state.outcome.exception() if retry_state.outcome else None
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return min(float(retry_after), _MAX_BACKOFF_SECONDS)
+    except (TypeError, ValueError):
+        return _backoff(retry_state)
+
+
+def _retry_policy(action_type: str) -> dict:
+    """tenacity kwargs shared by the sync and async call paths."""
+
+    def _log_backoff(retry_state: RetryCallState) -> None:
+        logger.warning(
+            "LLM | %s for action=%s — attempt %d/%d, retrying in %.1f s",
+            type(retry_state.outcome.exception()).__name__, action_type,
+            retry_state.attempt_number, _MAX_ATTEMPTS, retry_state.next_action.sleep,
+        )
+
+    return {
+        "retry": retry_if_exception_type(_RETRYABLE),
+        "wait": _retry_wait,
+        "stop": stop_after_attempt(_MAX_ATTEMPTS),
+        "before_sleep": _log_backoff,
+        "reraise": True,
+    }
+
+def _warn_if_on_event_loop(method: str) -> None:
+    """Sync methods block their thread for the whole call, backoff sleeps included.
+    Graph nodes run them on LangGraph's worker threads; on the event loop thread
+    they would stall every open stream, so flag any caller that gets that wrong."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    logger.warning("LLM | sync %s() called on a running event loop — use a%s()", method, method)
+
 
 # ---------------------------------------------------------------------------
 # LLMService
@@ -77,50 +151,92 @@ class LLMService:
     """
 
     def __init__(self) -> None:
-        settings = get_settings()
-        # One instance per model — reused across all calls
-        self._models: dict[str, ChatOpenAI] = {
-            model: ChatOpenAI(
-                model=model,
-                temperature=0,        # deterministic — required for compliance outputs
-                api_key=settings.openai_api_key,
-                timeout=30,
-            )
-            for model in {"gpt-4o", "gpt-4o-mini"}
-        }
+        self._api_key = get_settings().openai_api_key
+        # Shared by every model — one connection pool instead of one per ChatOpenAI
+        self._http_client = DefaultHttpxClient(http2=True, limits=_HTTP_LIMITS)
+        self._http_async_client = DefaultAsyncHttpxClient(http2=True, limits=_HTTP_LIMITS)
+        # One ChatOpenAI per model, built on first use — a model no action routes
+        # to is never constructed
+        self._models: dict[str, ChatOpenAI] = {}
+        # action_type → (model_name, ChatOpenAI) — one lookup per call in _model_for
+        self._routes: dict[str, tuple[str, ChatOpenAI]] = {}
+        # (model_name, schema) → with_structured_output runnable. Building one
+        # converts the schema to a tool spec and composes a parser chain — do it
+        # once per pair, not per call. Schemas are module-level classes, so the
+        # key set is small and fixed.
+        self._structured: dict[tuple[str, type], Runnable] = {}
 
     # ── Internal helpers ────────────────────────────────────────────────────
 
+    def _chat_model(self, model_name: str) -> ChatOpenAI:
+        llm = self._models.get(model_name)
+        if llm is None:
+            # Benign race across threads: both build a client, one wins
+            llm = self._models.setdefault(model_name, ChatOpenAI(
+                model=model_name,
+                temperature=0,        # deterministic — required for compliance outputs
+                api_key=self._api_key,
+                timeout=30,
+                max_retries=0,        # retries owned by _retry_policy, not the SDK
+                http_client=self._http_client,
+                http_async_client=self._http_async_client,
+            ))
+        return llm
+
     def _model_for(self, action_type: str) -> tuple[str, ChatOpenAI]:
-        model_name = _ACTION_TO_MODEL.get(action_type)
-        if not model_name:
-            raise ValueError(
-                f"Unknown action_type '{action_type}'. "
-                f"Valid types: {list(_ACTION_TO_MODEL)}"
+        route = self._routes.get(action_type)
+        if route is None:
+            model_name = _ACTION_TO_MODEL.get(action_type)
+            if not model_name:
+                raise ValueError(
+                    f"Unknown action_type '{action_type}'. "
+                    f"Valid types: {list(_ACTION_TO_MODEL)}"
+                )
+            route = self._routes.setdefault(action_type, (model_name, self._chat_model(model_name)))
+        return route
+
+    def _structured_for(self, action_type: str, schema: Type[T]) -> tuple[str, Runnable]:
+        model_name, llm = self._model_for(action_type)
+        key = (model_name, schema)
+        structured = self._structured.get(key)
+        if structured is None:
+            # Benign race across threads: both build the same runnable, one wins
+            structured = self._structured.setdefault(
+                key, llm.with_structured_output(schema, include_raw=True)
             )
-        return model_name, self._models[model_name]
+        return model_name, structured
 
     def _log_usage(
         self, action_type: str, model_name: str, result: AIMessage
     ) -> tuple[int, float]:
-        """Extract token counts and cost from an AIMessage, log them, and return the values."""
+        """Extract token counts and cost from an AIMessage, log them (INFO), and return the values."""
         meta = getattr(result, "usage_metadata", None)
         if not meta:
             return 0, 0.0
         input_tokens = meta.get("input_tokens", 0)
         output_tokens = meta.get("output_tokens", 0)
         total_tokens = meta.get("total_tokens", 0)
-        pricing = _COST_PER_TOKEN.get(model_name, {})
-        cost = (
-            input_tokens * pricing.get("input", 0)
-            + output_tokens * pricing.get("output", 0)
-        )
-        logger.info(
-            "LLM | action=%-14s model=%-12s tokens=%d (in=%d out=%d) cost=$%.6f",
-            action_type, model_name, total_tokens, input_tokens, output_tokens, cost,
-        )
+        in_rate, out_rate = _PRICING_CENTS_PER_MTOK.get(model_name, _NO_PRICING)
+        cost = (input_tokens * in_rate + output_tokens * out_rate) / _CENTS_PER_MTOK_TO_USD
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "LLM | action=%-14s model=%-12s tokens=%d (in=%d out=%d) cost=$%.6f",
+                action_type, model_name, total_tokens, input_tokens, output_tokens, cost,
+            )
         return total_tokens, cost
 
+    def _structured_result(
+        self, action_type: str, model_name: str, raw_result: dict
+    ) -> LLMResult:
+        """Unpack an include_raw=True result; parsing failures are not retried."""
+        if raw_result.get("parsing_error"):
+            raise RuntimeError(
+                f"Structured output parsing failed for {action_type}: "
+                f"{raw_result['parsing_error']}"
+            )
+        tokens_used, cost_usd = self._log_usage(action_type, model_name, raw_result["raw"])
+        return LLMResult(parsed=raw_result["parsed"], tokens_used=tokens_used, cost_usd=cost_usd)
+
     # ── Sync API ────────────────────────────────────────────────────────────
 
     @traceable(run_type="llm", name="invoke_structured")
@@ -131,72 +247,51 @@ class LLMService:
         Call the appropriate model and return an LLMResult(parsed, tokens_used, cost_usd).
 
         Uses include_raw=True so the raw AIMessage is accessible for usage metadata.
-        Retries once on RateLimitError (after 1 s) and once on APITimeoutError.
+        Rate limits and timeouts are retried with backoff (see _retry_policy).
+        Sync contexts only (graph nodes on worker threads) — async code uses
+        ainvoke_structured.
         """
-        model_name, llm = self._model_for(action_type)
-        structured = llm.with_structured_output(schema, include_raw=True)
-
-        for attempt in range(2):
-            try:
-                raw_result: dict = structured.invoke(messages)  # type: ignore[assignment]
-                if raw_result.get("parsing_error"):
-                    raise RuntimeError(
-                        f"Structured output parsing failed for {action_type}: "
-                        f"{raw_result['parsing_error']}"
-                    )
-                parsed = raw_result["parsed"]
-                tokens_used, cost_usd = self._log_usage(
-                    action_type, model_name, raw_result["raw"]
-                )
-                return LLMResult(parsed=parsed, tokens_used=tokens_used, cost_usd=cost_usd)
-            except openai.RateLimitError:
-                if attempt == 0:
-                    logger.warning("Rate limit hit for action=%s — retrying in 1 s", action_type)
-                    time.sleep(1)
-                    continue
-                raise
-            except openai.APITimeoutError:
-                if attempt == 0:
-                    logger.warning("Timeout for action=%s — retrying", action_type)
-                    continue
-                raise
-            except openai.APIError as exc:
-                raise RuntimeError(
-                    f"OpenAI API error during {action_type}: {exc}"
-                ) from exc
-
-        raise RuntimeError(f"invoke_structured failed after 2 attempts (action={action_type})")
+        _warn_if_on_event_loop("invoke_structured")
+        model_name, structured = self._structured_for(action_type, schema)
+
+        try:
+            for attempt in Retrying(**_retry_policy(action_type)):
+                with attempt:
+                    raw_result: dict = structured.invoke(messages)  # type: ignore[assignment]
+        except _RETRYABLE:
+            raise
+        except openai.APIError as exc:
+            raise RuntimeError(
+                f"OpenAI API error during {action_type}: {exc}"
+            ) from exc
+
+        return self._structured_result(action_type, model_name, raw_result)
 
     @traceable(run_type="llm", name="invoke")
     def invoke(self, action_type: str, messages: list[BaseMessage]) -> AIMessage:
         """
         Call the appropriate model and return the raw AIMessage.
-        Used when structured output is not needed.
+        Used when structured output is not needed. Sync contexts only — see
+        invoke_structured.
         """
+        _warn_if_on_event_loop("invoke")
         model_name, llm = self._model_for(action_type)
 
-        for attempt in range(2):
-            try:
-                result: AIMessage = llm.invoke(messages)  # type: ignore[assignment]
-                self._log_usage(action_type, model_name, result)
-                return result
-            except openai.RateLimitError:
-                if attempt == 0:
-                    logger.warning("Rate limit hit for action=%s — retrying in 1 s", action_type)
-                    time.sleep(1)
-                    continue
-                raise
-            except openai.APITimeoutError:
-                if attempt == 0:
-                    logger.warning("Timeout for action=%s — retrying", action_type)
-                    continue
-                raise
-            except openai.APIError as exc:
-                raise RuntimeError(
-                    f"OpenAI API error during {action_type}: {exc}"
-                ) from exc
-
-        raise RuntimeError(f"invoke failed after 2 attempts (action={action_type})")
+        try:
+            for attempt in Retrying(**_retry_policy(action_type)):
+                with attempt:
+                    result: AIMessage = llm.invoke(messages)  # type: ignore[assignment]
+        except _RETRYABLE:
+            raise
+        except openai.APIError as exc:
+            raise RuntimeError(
+                f"OpenAI API error during {action_type}: {exc}"
+            ) from exc
+
+        # Raw invokes don't return usage — skip computing it when it won't be logged
+        if logger.isEnabledFor(logging.INFO):
+            self._log_usage(action_type, model_name, result)
+        return result
 
     # ── Async API ────────────────────────────────────────────────────────────
     # Used by async LangGraph nodes (graph.astream → async node functions).
@@ -206,67 +301,41 @@ class LLMService:
         self, action_type: str, schema: Type[T], messages: list[BaseMessage]
     ) -> LLMResult:
         """Async variant of invoke_structured — returns LLMResult(parsed, tokens_used, cost_usd)."""
-        model_name, llm = self._model_for(action_type)
-        structured = llm.with_structured_output(schema, include_raw=True)
-
-        for attempt in range(2):
-            try:
-                raw_result: dict = await structured.ainvoke(messages)  # type: ignore[assignment]
-                if raw_result.get("parsing_error"):
-                    raise RuntimeError(
-                        f"Structured output parsing failed for {action_type}: "
-                        f"{raw_result['parsing_error']}"
-                    )
-                parsed = raw_result["parsed"]
-                tokens_used, cost_usd = self._log_usage(
-                    action_type, model_name, raw_result["raw"]
-                )
-                return LLMResult(parsed=parsed, tokens_used=tokens_used, cost_usd=cost_usd)
-            except openai.RateLimitError:
-                if attempt == 0:
-                    logger.warning("Rate limit hit for action=%s — retrying in 1 s", action_type)
-                    await asyncio.sleep(1)
-                    continue
-                raise
-            except openai.APITimeoutError:
-                if attempt == 0:
-                    logger.warning("Timeout for action=%s — retrying", action_type)
-                    continue
-                raise
-            except openai.APIError as exc:
-                raise RuntimeError(
-                    f"OpenAI API error during {action_type}: {exc}"
-                ) from exc
-
-        raise RuntimeError(f"ainvoke_structured failed after 2 attempts (action={action_type})")
+        model_name, structured = self._structured_for(action_type, schema)
+
+        try:
+            async for attempt in AsyncRetrying(**_retry_policy(action_type)):
+                with attempt:
+                    raw_result: dict = await structured.ainvoke(messages)  # type: ignore[assignment]
+        except _RETRYABLE:
+            raise
+        except openai.APIError as exc:
+            raise RuntimeError(
+                f"OpenAI API error during {action_type}: {exc}"
+            ) from exc
+
+        return self._structured_result(action_type, model_name, raw_result)
 
     @traceable(run_type="llm", name="ainvoke")
     async def ainvoke(self, action_type: str, messages: list[BaseMessage]) -> AIMessage:
         """Async variant of invoke for use in async graph nodes."""
         model_name, llm = self._model_for(action_type)
 
-        for attempt in range(2):
-            try:
-                result: AIMessage = await llm.ainvoke(messages)  # type: ignore[assignment]
-                self._log_usage(action_type, model_name, result)
-                return result
-            except openai.RateLimitError:
-                if attempt == 0:
-                    logger.warning("Rate limit hit for action=%s — retrying in 1 s", action_type)
-                    await asyncio.sleep(1)
-                    continue
-                raise
-            except openai.APITimeoutError:
-                if attempt == 0:
-                    logger.warning("Timeout for action=%s — retrying", action_type)
-                    continue
-                raise
-            except openai.APIError as exc:
-                raise RuntimeError(
-                    f"OpenAI API error during {action_type}: {exc}"
-                ) from exc
-
-        raise RuntimeError(f"ainvoke failed after 2 attempts (action={action_type})")
+        try:
+            async for attempt in AsyncRetrying(**_retry_policy(action_type)):
+                with attempt:
+                    result: AIMessage = await llm.ainvoke(messages)  # type: ignore[assignment]
+        except _RETRYABLE:
+            raise
+        except openai.APIError as exc:
+            raise RuntimeError(
+                f"OpenAI API error during {action_type}: {exc}"
+            ) from exc
+
+        # Raw invokes don't return usage — skip computing it when it won't be logged
+        if logger.isEnabledFor(logging.INFO):
+            self._log_usage(action_type, model_name, result)
+        return result
 
 
 # ---------------------------------------------------------------------------
@@ -281,5 +350,5 @@ def get_llm_service() -> LLMService:
     global _llm_service
     if _llm_service is None:
         _llm_service = LLMService()
-        logger.info("LLMService initialised (gpt-4o + gpt-4o-mini)")
+        logger.info("LLMService initialised (models built on first use)")
     return _llm_service
@@ -1,18 +1,29 @@
 # PDF text extraction and chunking service.
-# Uses pypdf directly (no temp files) + RecursiveCharacterTextSplitter.
-# Preserves page numbers through the splitting process via LangChain Document metadata.
+# Uses pypdfium2 (PDFium, native text extraction — several times faster than
+# pure-Python pypdf on multi-page policies) directly from bytes, no temp files,
+# + RecursiveCharacterTextSplitter.
+# Pages are split one at a time (iter_chunks), so each chunk carries its page number
+# and peak memory holds one page's text, not the whole document twice.
+#
+# pypdfium2 is imported inside iter_chunks: extraction runs in the routers'
+# process pool, so web workers (which only need MAX_PDF_BYTES / ChunkData from
+# here) never load the native PDFium library at startup.
 
 from dataclasses import dataclass
-from io import BytesIO
+from typing import Iterator
 
-from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from pypdf import PdfReader
-from pypdf.errors import PdfStreamError
 
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 150
 MIN_TEXT_LENGTH = 50  # Below this = likely scanned/corrupted/empty PDF
+MAX_PDF_BYTES = 20 * 1024 * 1024  # 20MB — the upload limit; also guards stored files on retry
+
+# Stateless once configured — built once per process, shared by every upload
+_SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+)
 
 
 @dataclass
@@ -22,50 +33,69 @@ class ChunkData:
     chunk_index: int  # 0-based position within document
 
 
-def extract_and_chunk(file_bytes: bytes) -> list[ChunkData]:
+def iter_chunks(file_bytes: bytes) -> Iterator[ChunkData]:
     """
-    Extract text from PDF bytes and split into overlapping chunks.
-    Raises ValueError with a user-friendly message on empty/unreadable PDFs.
+    Extract text from PDF bytes and yield overlapping chunks page by page, so
+    only one page's text is held at a time. Chunks never span pages.
+    Raises ValueError with a user-friendly message on empty/unreadable PDFs —
+    the MIN_TEXT_LENGTH check runs after the last page (at most one tiny chunk
+    can have been yielded by then).
     """
+    # Checked before PDFium allocates anything for the document
+    if len(file_bytes) > MAX_PDF_BYTES:
+        raise ValueError(
+            f"File too large. Maximum size is {MAX_PDF_BYTES // (1024 * 1024)}MB"
+        )
+
+    import pypdfium2 as pdfium  # deferred: only extraction workers need it
+
     try:
-        reader = PdfReader(BytesIO(file_bytes))
-    except (PdfStreamError, Exception) as e:
+        pdf = pdfium.PdfDocument(file_bytes)
+    except (pdfium.PdfiumError, Exception) as e:
         raise ValueError(
             "Could not read the PDF file. It may be corrupted or password-protected."
         ) from e
 
-    # Extract text page-by-page, tracking page numbers
-    documents: list[Document] = []
-    for page_num, page in enumerate(reader.pages):
-        text = page.extract_text() or ""
-        if text.strip():
-            documents.append(
-                Document(
-                    page_content=text,
-                    metadata={"page": page_num + 1},  # 1-based for citations
+    text_length = 0  # stripped chars across pages, for the MIN_TEXT_LENGTH guard
+    chunk_index = 0
+    try:
+        for page_num in range(len(pdf)):
+            page = pdf[page_num]
+            textpage = page.get_textpage()
+            # PDFium ends lines with \r\n — normalise so the splitter's "\n\n" / "\n"
+            # separators still find paragraph and line breaks
+            text = textpage.get_text_range().replace("\r\n", "\n")
+            textpage.close()
+            page.close()
+            stripped_length = len(text.strip())
+            if not stripped_length:
+                continue
+            text_length += stripped_length
+            for content in _SPLITTER.split_text(text):
+                yield ChunkData(
+                    content=content,
+                    page=page_num + 1,  # 1-based for citations
+                    chunk_index=chunk_index,
                 )
-            )
+                chunk_index += 1
+    except pdfium.PdfiumError as e:
+        raise ValueError(
+            "Could not read the PDF file. It may be corrupted or password-protected."
+        ) from e
+    finally:
+        pdf.close()
 
-    # Validate we have extractable text before embedding
-    total_text = " ".join(doc.page_content for doc in documents)
-    if len(total_text.strip()) < MIN_TEXT_LENGTH:
+    # Validate we had extractable text before anything is embedded
+    if text_length < MIN_TEXT_LENGTH:
         raise ValueError(
             "No extractable text found. "
             "The PDF may be image-based (scanned), corrupted, or password-protected."
         )
 
-    # Split into chunks while preserving page metadata
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-    )
-    split_docs = splitter.split_documents(documents)
 
-    return [
-        ChunkData(
-            content=doc.page_content,
-            page=doc.metadata.get("page", 1),
-            chunk_index=i,
-        )
-        for i, doc in enumerate(split_docs)
-    ]
+def extract_and_chunk(file_bytes: bytes) -> list[ChunkData]:
+    """
+    Extract text from PDF bytes and split into overlapping chunks.
+    Raises ValueError with a user-friendly message on empty/unreadable PDFs.
+    """
+    return list(iter_chunks(file_bytes))
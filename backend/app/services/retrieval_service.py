@@ -1,25 +1,94 @@
 # Retrieval service — shared by all 4 action nodes.
 #
 # Two strategies:
-#   search_chunks()     — adaptive-k semantic search via pgvector RPC (Inquire, Compare, Audit text)
-#   stratified_sample() — positional spread via direct table queries (Summarize, Compare holistic, Audit policy)
+#   search_chunks()     — adaptive-k semantic search via match_chunks (Inquire, Compare, Audit text)
+#                         search_chunks_many() = same for N queries: one batched embed
+#                         call + one match_chunks_batch query
+#   stratified_sample() — positional spread via stratified_sample_chunks (Summarize, Compare holistic, Audit policy)
 #
-# Both functions enrich chunks with doc_title via _enrich_with_titles() (DRY).
+# The SQL functions JOIN documents and return doc_title, so each strategy is one
+# round-trip — run directly on db_service's Postgres pool, not through PostgREST.
 # Confidence tier: high ≥ 0.7, medium ≥ 0.5, low < 0.5 (based on avg cosine similarity).
+# Adaptive-k: semantic results are also cut at the similarity "knee" (_knee_cutoff),
+# so a low-similarity tail above the threshold doesn't pad the LLM context.
+# match_chunks* run HNSW iterative scans, so doc-scoped searches still fill k;
+# ef_search comes from settings.hnsw_ef_search.
+#
+# Results cache: search_chunks / search_chunks_many results are kept for
+# _RESULT_TTL_SECONDS per exact (user, doc scope, k, threshold, query text) —
+# a re-asked or re-rewritten query skips both the embed call and the query. The
+# ingest/retry routes call invalidate_user() when a user's documents change.
+#
+# run_concurrently() fans independent retrievals (Compare per-doc, Audit per-theme)
+# out over one shared module-level pool instead of running them back to back.
 
+import contextvars
 import logging
+import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable
 
-from langsmith import traceable
+from cachetools import TTLCache
 
-from app.services.embedding_service import embed_texts
-from app.services.supabase_client import get_supabase
+from app.config import get_settings
+from app.services.embedding_service import embed_query, embed_texts
+from app.services.db_service import fetch_all
+from app.utils.tracing import traceable
 
 logger = logging.getLogger(__name__)
 
 # Per-doc chunk cap for adaptive-k: prevents a single large doc dominating retrieval
 _MAX_CHUNKS_PER_DOC = 5
 
+_TIERS = ("low", "medium", "high")
+
+# Knee cutoff: only attempted on >= _KNEE_MIN_CHUNKS results, and only applied
+# when the curve bends clearly (normalised gain >= _KNEE_MIN_GAIN) — a near-linear
+# decline has no meaningful knee and is kept whole
+_KNEE_MIN_CHUNKS = 6
+_KNEE_MIN_GAIN = 0.2
+
+# Decimal places kept per query-embedding component in query parameters — same
+# precision the ingest route stores chunk embeddings at (error ≤ 5e-7, negligible
+# for cosine ranking); ~9-char instead of ~20-char reprs halves the parameter.
+_EMBEDDING_DECIMALS = 6
+
+# SQL functions called directly over db_service's pool (no PostgREST hop).
+# ids are cast to text so rows match the string ids used everywhere else.
+_MATCH_CHUNKS_SQL = """
+SELECT id::text AS id, document_id::text AS document_id, doc_title,
+       chunk_index, page, content, similarity
+FROM match_chunks(
+  %(query_embedding)s::vector, %(filter_user_id)s::uuid, %(filter_doc_ids)s::uuid[],
+  %(match_threshold)s::float8, %(match_count)s::int, %(ef_search)s::int
+)
+"""
+_MATCH_CHUNKS_BATCH_SQL = """
+SELECT query_idx, id::text AS id, document_id::text AS document_id, doc_title,
+       chunk_index, page, content, similarity
+FROM match_chunks_batch(
+  %(query_embeddings)s::jsonb, %(filter_user_id)s::uuid, %(filter_doc_ids)s::uuid[],
+  %(match_threshold)s::float8, %(match_count)s::int, %(ef_search)s::int
+)
+"""
+_STRATIFIED_SAMPLE_SQL = """
+SELECT id::text AS id, document_id::text AS document_id, doc_title,
+       chunk_index, page, content
+FROM stratified_sample_chunks(
+  %(filter_user_id)s::uuid, %(filter_doc_ids)s::uuid[], %(per_band)s::int
+)
+"""
+
+_RESULT_TTL_SECONDS = 120
+# (user_id, sorted doc_ids, k, threshold, query_text) → search result
+_results: TTLCache = TTLCache(maxsize=2048, ttl=_RESULT_TTL_SECONDS)
+_results_lock = threading.Lock()
+
+# Shared by every node's retrieval fan-out; bounds concurrent embed + search calls
+# per process to fewer than db_service's 10 pooled connections
+_RETRIEVAL_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+
 
 # ---------------------------------------------------------------------------
 # Internal helpers
@@ -31,46 +100,79 @@ def _score_confidence(similarities: list[float]) -> tuple[str, float]:
     if not similarities:
         return "low", 0.0
     avg = sum(similarities) / len(similarities)
-    if avg >= 0.7:
-        tier = "high"
-    elif avg >= 0.5:
-        tier = "medium"
-    else:
-        tier = "low"
-    return tier, avg
+    # bools sum to the tier index: < 0.5 → 0, ≥ 0.5 → 1, ≥ 0.7 → 2
+    return _TIERS[(avg >= 0.5) + (avg >= 0.7)], avg
 
 
-def _enrich_with_titles(chunks: list[dict]) -> list[dict]:
+def run_concurrently(fn: Callable[[Any], Any], items: Iterable[Any]) -> list:
     """
-    Fetch doc titles for all unique document_ids in chunks and merge into each chunk dict.
-
-    Returns new list of dicts with added 'doc_title' key.
-    match_chunks RPC does not return titles; we do one extra query here (DRY).
+    Apply fn to each item on the shared retrieval pool; results in input order.
+    Each call runs in a copy of the caller's context so LangSmith spans stay
+    nested under the calling node. The first exception is re-raised.
     """
-    if not chunks:
-        return chunks
+    futures = [
+        _RETRIEVAL_EXECUTOR.submit(contextvars.copy_context().run, fn, item)
+        for item in items
+    ]
+    return [future.result() for future in futures]
 
-    unique_doc_ids = list({c["document_id"] for c in chunks})
 
-    try:
-        resp = (
-            get_supabase()
-            .table("documents")
-            .select("id, title")
-            .in_("id", unique_doc_ids)
-            .execute()
-        )
-        id_to_title: dict[str, str] = {
-            row["id"]: row["title"] for row in (resp.data or [])
-        }
-    except Exception as e:
-        logger.warning("retrieval | _enrich_with_titles failed: %s — using doc_id fallback", e)
-        id_to_title = {}
+def _vector_literal(embedding: list[float]) -> str:
+    """pgvector text input ('[x,y,...]') at _EMBEDDING_DECIMALS precision."""
+    return "[" + ",".join([str(round(x, _EMBEDDING_DECIMALS)) for x in embedding]) + "]"
 
-    return [
-        {**chunk, "doc_title": id_to_title.get(chunk["document_id"], chunk["document_id"])}
-        for chunk in chunks
-    ]
+
+def _result_key(
+    query_text: str, user_id: str, doc_ids: list[str] | None, k: int, threshold: float
+) -> tuple:
+    return (user_id, tuple(sorted(doc_ids)) if doc_ids else None, k, threshold, query_text)
+
+
+def _copy_result(result: dict) -> dict:
+    # Callers annotate chunk dicts in place (audit tags "theme") — never hand out
+    # the cached dicts themselves
+    return {**result, "chunks": [dict(c) for c in result["chunks"]]}
+
+
+def _get_cached_result(key: tuple) -> dict | None:
+    with _results_lock:
+        result = _results.get(key)
+    return _copy_result(result) if result is not None else None
+
+
+def _cache_result(key: tuple, result: dict) -> None:
+    with _results_lock:
+        _results[key] = _copy_result(result)
+
+
+def invalidate_user(user_id: str) -> None:
+    """Drop a user's cached search results (call when their documents change)."""
+    with _results_lock:
+        for key in [k for k in _results if k[0] == user_id]:
+            _results.pop(key, None)
+
+
+def _knee_cutoff(similarities: list[float]) -> int:
+    """
+    Number of leading results to keep from a similarity-desc list (Kneedle).
+
+    Normalises rank and similarity drop to [0, 1]; the knee is the rank where the
+    drop curve sits furthest above the diagonal — the end of the steep fall.
+    Results up to and including the knee are kept.
+    """
+    n = len(similarities)
+    if n < _KNEE_MIN_CHUNKS:
+        return n
+    top = similarities[0]
+    span = top - similarities[-1]
+    if span <= 1e-9:
+        return n
+    best_idx, best_gain = n - 1, 0.0
+    for i, sim in enumerate(similarities):
+        gain = (top - sim) / span - i / (n - 1)
+        if gain > best_gain:
+            best_idx, best_gain = i, gain
+    return best_idx + 1 if best_gain >= _KNEE_MIN_GAIN else n
 
 
 # ---------------------------------------------------------------------------
@@ -87,7 +189,7 @@ def search_chunks(
     threshold: float = 0.5,
 ) -> dict:
     """
-    Embed query_text, call match_chunks RPC, cap per-doc chunks, return enriched results.
+    Embed query_text, call match_chunks (rows carry doc_title), cap per-doc chunks.
 
     Args:
         query_text: the user's question or search phrase
@@ -103,28 +205,109 @@ def search_chunks(
             "avg_similarity": float,
         }
     """
-    # Embed the query (single vector, not batched)
+    cache_key = _result_key(query_text, user_id, doc_ids, k, threshold)
+    cached = _get_cached_result(cache_key)
+    if cached is not None:
+        logger.info("retrieval | search_chunks cache hit: query=%r", query_text[:60])
+        return cached
+
+    # Embed the query (single vector, memoised — repeat/rewritten-cached queries skip the API)
     try:
-        query_embedding = embed_texts([query_text])[0]
+        query_embedding = embed_query(query_text)
     except Exception as e:
         logger.error("retrieval | embedding failed for query %r: %s", query_text[:80], e)
         return {"chunks": [], "confidence_tier": "low", "avg_similarity": 0.0}
 
-    # Call RPC
+    # Call match_chunks
     try:
-        rpc_params = {
-            "query_embedding": query_embedding,
+        raw_chunks = fetch_all(_MATCH_CHUNKS_SQL, {
+            "query_embedding": _vector_literal(query_embedding),
             "filter_user_id": user_id,
             "filter_doc_ids": doc_ids if doc_ids else None,
             "match_threshold": threshold,
             "match_count": k,
-        }
-        resp = get_supabase().rpc("match_chunks", rpc_params).execute()
-        raw_chunks: list[dict] = resp.data or []
+            "ef_search": get_settings().hnsw_ef_search,
+        })
     except Exception as e:
-        logger.error("retrieval | match_chunks RPC failed: %s", e)
+        logger.error("retrieval | match_chunks query failed: %s", e)
         return {"chunks": [], "confidence_tier": "low", "avg_similarity": 0.0}
 
+    result = _cap_and_score(query_text, raw_chunks, doc_ids, k, threshold)
+    _cache_result(cache_key, result)
+    return result
+
+
+@traceable(name="search_chunks_many", run_type="retriever")
+def search_chunks_many(
+    queries: list[str],
+    user_id: str,
+    doc_ids: list[str] | None,
+    k: int = 15,
+    threshold: float = 0.5,
+) -> list[dict]:
+    """
+    search_chunks for several queries over the same doc scope. Cached queries
+    are served directly; the rest cost two calls total — one batched embedding
+    request and one match_chunks_batch query. Results align with queries.
+    """
+    if not queries:
+        return []
+
+    # Serve cached queries; only misses are embedded and searched
+    keys = [_result_key(q, user_id, doc_ids, k, threshold) for q in queries]
+    results: list[dict | None] = [_get_cached_result(key) for key in keys]
+    miss_idx = [i for i, result in enumerate(results) if result is None]
+    if not miss_idx:
+        return results  # type: ignore[return-value]
+    miss_queries = [queries[i] for i in miss_idx]
+
+    try:
+        embeddings = embed_texts(miss_queries)
+    except Exception as e:
+        logger.error("retrieval | batch embedding failed for %d queries: %s", len(miss_queries), e)
+        embeddings = None
+
+    rows: list[dict] | None = None
+    if embeddings is not None:
+        try:
+            rows = fetch_all(_MATCH_CHUNKS_BATCH_SQL, {
+                # JSON array of vectors: each element's text is pgvector input format
+                "query_embeddings": "[" + ",".join(map(_vector_literal, embeddings)) + "]",
+                "filter_user_id": user_id,
+                "filter_doc_ids": doc_ids if doc_ids else None,
+                "match_threshold": threshold,
+                "match_count": k,
+                "ef_search": get_settings().hnsw_ef_search,
+            })
+        except Exception as e:
+            logger.error("retrieval | match_chunks_batch query failed: %s", e)
+
+    if rows is None:
+        # Failures degrade to empty results (not cached) like search_chunks
+        for i in miss_idx:
+            results[i] = {"chunks": [], "confidence_tier": "low", "avg_similarity": 0.0}
+        return results  # type: ignore[return-value]
+
+    # Rows arrive grouped by query_idx (index into miss_queries), similarity desc
+    raw_by_query: list[list[dict]] = [[] for _ in miss_queries]
+    for row in rows:
+        raw_by_query[row.pop("query_idx")].append(row)
+
+    for i, raw_chunks in zip(miss_idx, raw_by_query):
+        result = _cap_and_score(queries[i], raw_chunks, doc_ids, k, threshold)
+        _cache_result(keys[i], result)
+        results[i] = result
+    return results  # type: ignore[return-value]
+
+
+def _cap_and_score(
+    query_text: str,
+    raw_chunks: list[dict],
+    doc_ids: list[str] | None,
+    k: int,
+    threshold: float,
+) -> dict:
+    """Per-doc cap + confidence over one query's match rows (sorted by similarity desc)."""
     logger.info(
         "retrieval | search_chunks: query=%r docs=%s k=%d threshold=%.2f → %d raw chunks",
         query_text[:60], doc_ids, k, threshold, len(raw_chunks),
@@ -133,25 +316,34 @@ def search_chunks(
     if not raw_chunks:
         return {"chunks": [], "confidence_tier": "low", "avg_similarity": 0.0}
 
-    # Cap per-doc: prevent one large doc from filling all slots
+    # Adaptive-k: drop the tail past the similarity knee
+    keep = _knee_cutoff([c["similarity"] for c in raw_chunks])
+    if keep < len(raw_chunks):
+        logger.info("retrieval | knee cutoff: keeping %d of %d", keep, len(raw_chunks))
+        raw_chunks = raw_chunks[:keep]
+
+    # Cap per-doc: prevent one large doc from filling all slots.
+    # Scoped searches can't keep more than cap × len(doc_ids) — stop once full.
+    max_capped = _MAX_CHUNKS_PER_DOC * len(doc_ids) if doc_ids else len(raw_chunks)
     doc_chunk_counts: dict[str, int] = defaultdict(int)
     capped: list[dict] = []
-    for chunk in raw_chunks:  # already sorted by similarity desc from RPC
+    for chunk in raw_chunks:  # already sorted by similarity desc from match_chunks
         doc_id = chunk["document_id"]
         if doc_chunk_counts[doc_id] < _MAX_CHUNKS_PER_DOC:
             capped.append(chunk)
             doc_chunk_counts[doc_id] += 1
+            if len(capped) >= max_capped:
+                break
 
-    enriched = _enrich_with_titles(capped)
-    similarities = [c["similarity"] for c in enriched]
+    similarities = [c["similarity"] for c in capped]
     tier, avg = _score_confidence(similarities)
 
     logger.info(
         "retrieval | after cap: %d chunks, confidence=%s avg_sim=%.3f",
-        len(enriched), tier, avg,
+        len(capped), tier, avg,
     )
 
-    return {"chunks": enriched, "confidence_tier": tier, "avg_similarity": avg}
+    return {"chunks": capped, "confidence_tier": tier, "avg_similarity": avg}
 
 
 # ---------------------------------------------------------------------------
@@ -164,8 +356,10 @@ def stratified_sample(user_id: str, doc_ids: list[str]) -> dict:
     """
     Positional spread across each document — 4 bands, 4 chunks per band (~16 per doc).
 
-    Does NOT use match_chunks RPC (semantic search is biased toward repeated terms).
-    Uses direct Supabase table queries by chunk_index range.
+    Does NOT use match_chunks (semantic search is biased toward repeated terms).
+    One stratified_sample_chunks call bands every doc from documents.chunk_count
+    (one index range scan per band) and returns the picks with doc_title,
+    ordered by doc then position.
 
     Returns:
         {
@@ -173,67 +367,28 @@ def stratified_sample(user_id: str, doc_ids: list[str]) -> dict:
             "confidence_tier": "high",  # positional sampling always covers the full doc
         }
     """
-    all_chunks: list[dict] = []
-    supabase = get_supabase()
+    if not doc_ids:
+        return {"chunks": [], "confidence_tier": "high"}
 
-    for doc_id in doc_ids:
-        # Step 1: get total chunk count for this doc
-        try:
-            count_resp = (
-                supabase
-                .table("chunks")
-                .select("chunk_index", count="exact")
-                .eq("document_id", doc_id)
-                .eq("user_id", user_id)
-                .execute()
-            )
-            total = count_resp.count or 0
-        except Exception as e:
-            logger.error("retrieval | stratified count failed for doc=%s: %s", doc_id, e)
-            continue
+    try:
+        rows = fetch_all(_STRATIFIED_SAMPLE_SQL, {
+            "filter_user_id": user_id, "filter_doc_ids": doc_ids, "per_band": 4,
+        })
+    except Exception as e:
+        logger.error("retrieval | stratified_sample_chunks query failed: %s", e)
+        rows = []
+
+    sampled: dict[str, int] = defaultdict(int)
+    for row in rows:
+        sampled[row["document_id"]] += 1
 
-        if total == 0:
+    for doc_id in doc_ids:
+        if doc_id in sampled:
+            logger.info("retrieval | stratified doc=%s sampled=%d", doc_id, sampled[doc_id])
+        else:
             logger.warning("retrieval | stratified: no chunks found for doc=%s", doc_id)
-            continue
-
-        # Step 2: divide into 4 bands and fetch 4 chunks per band
-        band_size = max(total // 4, 1)
-        doc_chunks: list[dict] = []
-
-        for band_idx in range(4):
-            band_start = band_idx * band_size
-            # Last band extends to end to avoid off-by-one gaps
-            band_end = (band_idx + 1) * band_size if band_idx < 3 else total
-
-            try:
-                band_resp = (
-                    supabase
-                    .table("chunks")
-                    .select("id, document_id, chunk_index, page, content")
-                    .eq("document_id", doc_id)
-                    .eq("user_id", user_id)
-                    .gte("chunk_index", band_start)
-                    .lt("chunk_index", band_end)
-                    .order("chunk_index")
-                    .limit(4)
-                    .execute()
-                )
-                doc_chunks.extend(band_resp.data or [])
-            except Exception as e:
-                logger.error(
-                    "retrieval | stratified band fetch failed doc=%s band=%d: %s",
-                    doc_id, band_idx, e,
-                )
-
-        logger.info(
-            "retrieval | stratified doc=%s total_chunks=%d sampled=%d",
-            doc_id, total, len(doc_chunks),
-        )
-        all_chunks.extend(doc_chunks)
-
-    enriched = _enrich_with_titles(all_chunks)
 
     return {
-        "chunks": enriched,
+        "chunks": rows,
         "confidence_tier": "high",  # positional sampling covers full document — always high
     }
@@ -0,0 +1,98 @@
+# Semantic response cache — process-local, used by inquire_action.
+#
+# A question that is a near-paraphrase of one answered moments ago (same user,
+# same documents, same options) is served from memory instead of paying for the
+# rewrite LLM call, pgvector retrieval, optional Tavily and the answer LLM call.
+#
+# Keying:
+#   scope   — exact tuple (user_id, sorted doc_ids, action, web flag, ...) so answers
+#             never leak across users, document sets or web-search modes.
+#             user_id must come first: invalidate_user() matches on scope[0]
+#   vector  — L2-normalised query embedding; hit = cosine ≥ threshold within scope
+#
+# Entries expire after _TTL_SECONDS and the whole cache is LRU-bounded at
+# _MAX_ENTRIES. Entries are bucketed by scope, so a lookup only scores the few
+# vectors cached for that exact (user, docs, options) combination — a flat
+# inner-product scan there is cheaper than maintaining any ANN index.
+# The ingest/retry routes call invalidate_user() when a user's documents change,
+# so an answer (or a "nothing found") from before an upload is not served after it.
+# Lock-guarded: sync nodes run on LangGraph's thread pool.
+
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from operator import mul
+
+_TTL_SECONDS = 300
+_MAX_ENTRIES = 1024
+
+# (scope, seq) → (expires_at, unit_vector, payload); OrderedDict order = LRU order
+_entries: OrderedDict[tuple, tuple[float, array, dict]] = OrderedDict()
+# scope → keys of _entries in that scope (subset index for lookup)
+_by_scope: dict[tuple, set[tuple]] = {}
+_seq = 0
+_lock = threading.Lock()
+
+
+def _normalise(vector: list[float]) -> array:
+    # Packed doubles: half the memory of a list of floats, same C-level iteration
+    norm = math.sqrt(sum(map(mul, vector, vector)))
+    return array("d", (x / norm for x in vector) if norm else vector)
+
+
+def _drop(key: tuple) -> None:
+    """Remove one entry from both structures. Caller holds _lock."""
+    _entries.pop(key, None)
+    keys = _by_scope.get(key[0])
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del _by_scope[key[0]]
+
+
+def lookup(scope: tuple, embedding: list[float], threshold: float) -> dict | None:
+    """
+    Return the stored payload of the most similar live entry in scope, or None.
+    A hit is refreshed to most-recently-used.
+    """
+    query = _normalise(embedding)
+    now = time.monotonic()
+    best_key, best_score = None, threshold
+
+    with _lock:
+        for key in list(_by_scope.get(scope, ())):
+            expires_at, vector, _ = _entries[key]
+            if expires_at <= now:
+                _drop(key)
+                continue
+            score = sum(map(mul, query, vector))
+            if score >= best_score:
+                best_key, best_score = key, score
+
+        if best_key is None:
+            return None
+        _entries.move_to_end(best_key)
+        return _entries[best_key][2]
+
+
+def store(scope: tuple, embedding: list[float], payload: dict) -> None:
+    """Insert a payload for this scope/embedding, evicting the LRU entry when full."""
+    global _seq
+    vector = _normalise(embedding)
+    with _lock:
+        _seq += 1
+        key = (scope, _seq)
+        _entries[key] = (time.monotonic() + _TTL_SECONDS, vector, payload)
+        _by_scope.setdefault(scope, set()).add(key)
+        while len(_entries) > _MAX_ENTRIES:
+            _drop(next(iter(_entries)))
+
+
+def invalidate_user(user_id: str) -> None:
+    """Drop every cached answer in the user's scopes (call when their documents change)."""
+    with _lock:
+        for scope in [s for s in _by_scope if s[0] == user_id]:
+            for key in _by_scope.pop(scope):
+                _entries.pop(key, None)
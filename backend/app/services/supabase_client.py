@@ -1,15 +1,37 @@
 # Shared Supabase admin client for backend operations.
 # Uses the service key to bypass RLS — all queries MUST include user_id
 # explicitly for data isolation. Never expose this client to the browser.
+#
+# One client per process (lru_cache) over one explicit httpx.Client, so every
+# PostgREST/storage call reuses pooled keep-alive connections (HTTP/2 via h2)
+# instead of paying a fresh TLS handshake.
 
 from functools import lru_cache
 
-from supabase import Client, create_client
+import httpx
+from supabase import Client, ClientOptions, create_client
 
 from app.config import get_settings
 
+# Matches postgrest's own default timeout — bulk chunk inserts and 20MB storage
+# uploads run well past httpx's 5s default.
+_HTTP_TIMEOUT_SECONDS = 120.0
 
-@lru_cache()
+# Sized for concurrent graph runs, each fanning out up to 8 retrieval calls
+# (retrieval_service), plus ingest inserts — idle connections stay warm
+_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+
+
+@lru_cache(maxsize=None)
 def get_supabase() -> Client:
     settings = get_settings()
-    return create_client(settings.supabase_url, settings.supabase_secret_key)
+    http_client = httpx.Client(
+        http2=True,
+        timeout=_HTTP_TIMEOUT_SECONDS,
+        limits=_HTTP_LIMITS,
+    )
+    return create_client(
+        settings.supabase_url,
+        settings.supabase_secret_key,
+        options=ClientOptions(httpx_client=http_client),
+    )
@@ -5,16 +5,26 @@
 #
 # Cost: 1 credit per basic search (1,000 free credits/month on Tavily free tier).
 # If TAVILY_API_KEY is unset, returns [] silently so the graph continues without web results.
+#
+# One TavilyClient per process (lru_cache) — reuses its HTTP session across searches
+# instead of building a client per call.
 
 import logging
-
-from langsmith import traceable
+from functools import lru_cache
 
 from app.config import get_settings
+from app.utils.tracing import traceable
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=None)
+def _tavily_client():
+    from tavily import TavilyClient  # deferred import: only needed when key is set
+
+    return TavilyClient(api_key=get_settings().tavily_api_key)
+
+
 @traceable(name="web_search", run_type="tool")
 def web_search(query: str, max_results: int = 5) -> list[dict]:
     """
@@ -36,10 +46,7 @@ def web_search(query: str, max_results: int = 5) -> list[dict]:
         return []
 
     try:
-        from tavily import TavilyClient  # deferred import: only needed when key is set
-
-        client = TavilyClient(api_key=api_key)
-        response = client.search(
+        response = _tavily_client().search(
             query=query,
             search_depth="advanced",     # richer content snippets (2 credits/search)
             max_results=max_results,
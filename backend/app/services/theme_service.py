@@ -10,10 +10,10 @@
 import logging
 
 from langchain_core.messages import HumanMessage, SystemMessage
-from langsmith import traceable
 from pydantic import BaseModel
 
 from app.services.llm_service import LLMResult, get_llm_service
+from app.utils.tracing import traceable
 
 logger = logging.getLogger(__name__)
 
@@ -0,0 +1,30 @@
+# LangSmith @traceable, gated on settings.langsmith_tracing.
+#
+# langsmith.traceable wraps every call in run-tree bookkeeping (signature binding,
+# input/output capture) even when nothing is sent. With tracing off, this
+# decorator returns the function untouched so graph nodes pay nothing.
+#
+# Same switch chat.py passes to ls.tracing_context, so graph runs and their
+# @traceable child spans are always on or off together — including deploys that
+# set tracing only through .env / Settings, not the exported env var.
+# Decided when each decorated module is imported (main.py loads .env first), so
+# toggling tracing requires a process restart.
+
+from functools import lru_cache
+from typing import Any, Callable
+
+from langsmith import traceable as _ls_traceable
+
+from app.config import get_settings
+
+
+@lru_cache(maxsize=None)
+def tracing_enabled() -> bool:
+    return get_settings().langsmith_tracing.strip().lower() == "true"
+
+
+def traceable(**kwargs: Any) -> Callable[[Callable], Callable]:
+    """Drop-in for langsmith.traceable(**kwargs) that is a no-op when tracing is off."""
+    if tracing_enabled():
+        return _ls_traceable(**kwargs)
+    return lambda fn: fn
@@ -1,5 +1,5 @@
 -- match_chunks: pgvector cosine similarity search scoped to user + optional doc list.
--- Called via supabase.rpc("match_chunks", {...}) from retrieval_service.py.
+-- Called from retrieval_service.py over db_service's psycopg pool (SELECT ... FROM match_chunks(...)).
 -- Uses the existing HNSW index (idx_chunks_embedding) automatically.
 
 CREATE OR REPLACE FUNCTION match_chunks(
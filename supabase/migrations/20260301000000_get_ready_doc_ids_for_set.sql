@@ -0,0 +1,18 @@
+-- get_ready_doc_ids_for_set: ready document ids in a set, scoped to the owner.
+-- Called via supabase.rpc("get_ready_doc_ids_for_set", {...}) from validate_inputs.py.
+-- Returns a single text[] so the client decodes one JSON array of strings
+-- instead of one {"id": ...} object per row.
+
+CREATE OR REPLACE FUNCTION get_ready_doc_ids_for_set(
+  filter_set_id uuid,
+  filter_user_id uuid
+)
+RETURNS text[]
+LANGUAGE sql STABLE
+AS $$
+  SELECT COALESCE(array_agg(d.id::text), '{}')
+  FROM documents d
+  WHERE d.set_id = filter_set_id
+    AND d.user_id = filter_user_id
+    AND d.status = 'ready';
+$$;
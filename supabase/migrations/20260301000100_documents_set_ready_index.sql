@@ -0,0 +1,11 @@
+-- Partial covering index for set expansion (get_ready_doc_ids_for_set).
+-- The query filters set_id + user_id + status = 'ready' and reads only id:
+--   - WHERE status = 'ready' keeps processing/failed rows out of the index,
+--     so status needn't be a key column
+--   - INCLUDE (id) lets the planner answer with an index-only scan
+-- Verify: EXPLAIN ANALYZE SELECT id FROM documents
+--   WHERE set_id = '...' AND user_id = '...' AND status = 'ready';
+
+CREATE INDEX idx_documents_set_ready
+  ON documents(set_id, user_id) INCLUDE (id)
+  WHERE status = 'ready';
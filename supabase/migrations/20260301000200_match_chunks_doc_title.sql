@@ -0,0 +1,41 @@
+-- match_chunks: return doc_title alongside each chunk.
+-- retrieval_service.search_chunks used to follow every call with a second
+-- SELECT on documents just to label chunks; joining here makes it one round-trip.
+-- The return row type changes, so the old signature must be dropped first.
+
+DROP FUNCTION IF EXISTS match_chunks(vector(1536), uuid, uuid[], float, int);
+
+CREATE OR REPLACE FUNCTION match_chunks(
+  query_embedding vector(1536),
+  filter_user_id uuid,
+  filter_doc_ids uuid[] DEFAULT NULL,
+  match_threshold float DEFAULT 0.5,
+  match_count int DEFAULT 15
+)
+RETURNS TABLE (
+  id uuid,
+  document_id uuid,
+  doc_title text,
+  chunk_index int,
+  page int,
+  content text,
+  similarity float
+)
+LANGUAGE sql STABLE
+AS $$
+  SELECT
+    c.id,
+    c.document_id,
+    d.title AS doc_title,
+    c.chunk_index,
+    c.page,
+    c.content,
+    1 - (c.embedding <=> query_embedding) AS similarity
+  FROM chunks c
+  JOIN documents d ON d.id = c.document_id
+  WHERE c.user_id = filter_user_id
+    AND (filter_doc_ids IS NULL OR c.document_id = ANY(filter_doc_ids))
+    AND 1 - (c.embedding <=> query_embedding) > match_threshold
+  ORDER BY c.embedding <=> query_embedding ASC
+  LIMIT LEAST(match_count, 200);
+$$;
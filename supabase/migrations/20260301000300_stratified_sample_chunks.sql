@@ -0,0 +1,59 @@
+-- stratified_sample_chunks: positional spread across each document in one query.
+-- Called from retrieval_service.py over db_service's psycopg pool.
+-- Replaces 1 count + 4 band SELECTs per document (5N round-trips).
+--
+-- Bands match the Python sampler exactly: band_size = max(total / 4, 1) and
+-- band = min(chunk_index / band_size, 3), so the last band runs to the end.
+-- The window pass touches only index columns; content is read for the
+-- <= per_band * 4 picked rows per document.
+
+CREATE OR REPLACE FUNCTION stratified_sample_chunks(
+  filter_user_id uuid,
+  filter_doc_ids uuid[],
+  per_band int DEFAULT 4
+)
+RETURNS TABLE (
+  id uuid,
+  document_id uuid,
+  doc_title text,
+  chunk_index int,
+  page int,
+  content text,
+  band int
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH banded AS (
+    SELECT
+      c.id,
+      c.document_id,
+      c.chunk_index,
+      LEAST(
+        c.chunk_index / GREATEST(COUNT(*) OVER (PARTITION BY c.document_id) / 4, 1),
+        3
+      )::int AS band
+    FROM chunks c
+    WHERE c.user_id = filter_user_id
+      AND c.document_id = ANY(filter_doc_ids)
+  ),
+  picked AS (
+    SELECT
+      b.id,
+      b.band,
+      ROW_NUMBER() OVER (PARTITION BY b.document_id, b.band ORDER BY b.chunk_index) AS rn
+    FROM banded b
+  )
+  SELECT
+    c.id,
+    c.document_id,
+    d.title AS doc_title,
+    c.chunk_index,
+    c.page,
+    c.content,
+    p.band
+  FROM picked p
+  JOIN chunks c ON c.id = p.id
+  JOIN documents d ON d.id = c.document_id
+  WHERE p.rn <= per_band
+  ORDER BY array_position(filter_doc_ids, c.document_id), c.chunk_index;
+$$;
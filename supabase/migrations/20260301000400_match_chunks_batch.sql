@@ -0,0 +1,59 @@
+-- match_chunks_batch: match_chunks for several query embeddings in one call.
+-- Called from retrieval_service.search_chunks_many over db_service's psycopg pool,
+-- which was paying one round-trip per query.
+--
+-- query_embeddings is a JSON array of 1536-float arrays. Each element's JSON text
+-- ("[0.1, ...]") is exactly pgvector's input format, so it casts directly.
+-- Each query runs its own ORDER BY distance LIMIT through a LATERAL join, so the
+-- HNSW index (idx_chunks_embedding) is used per query just like match_chunks.
+-- query_idx is 0-based, matching the caller's list.
+
+CREATE OR REPLACE FUNCTION match_chunks_batch(
+  query_embeddings jsonb,
+  filter_user_id uuid,
+  filter_doc_ids uuid[] DEFAULT NULL,
+  match_threshold float DEFAULT 0.5,
+  match_count int DEFAULT 15
+)
+RETURNS TABLE (
+  query_idx int,
+  id uuid,
+  document_id uuid,
+  doc_title text,
+  chunk_index int,
+  page int,
+  content text,
+  similarity float
+)
+LANGUAGE sql STABLE
+AS $$
+  SELECT
+    (q.ord - 1)::int AS query_idx,
+    m.id,
+    m.document_id,
+    m.doc_title,
+    m.chunk_index,
+    m.page,
+    m.content,
+    m.similarity
+  FROM jsonb_array_elements(query_embeddings) WITH ORDINALITY AS q(embedding, ord)
+  CROSS JOIN LATERAL (SELECT (q.embedding::text)::vector(1536) AS v) qv
+  CROSS JOIN LATERAL (
+    SELECT
+      c.id,
+      c.document_id,
+      d.title AS doc_title,
+      c.chunk_index,
+      c.page,
+      c.content,
+      1 - (c.embedding <=> qv.v) AS similarity
+    FROM chunks c
+    JOIN documents d ON d.id = c.document_id
+    WHERE c.user_id = filter_user_id
+      AND (filter_doc_ids IS NULL OR c.document_id = ANY(filter_doc_ids))
+      AND 1 - (c.embedding <=> qv.v) > match_threshold
+    ORDER BY c.embedding <=> qv.v ASC
+    LIMIT LEAST(match_count, 200)
+  ) m
+  ORDER BY q.ord, m.similarity DESC;
+$$;
@@ -0,0 +1,76 @@
+-- stratified_sample_chunks: band from documents.chunk_count instead of counting.
+-- chunk_count is written by the ingest/retry routes when a document becomes
+-- ready, so band boundaries are known up front. Each (doc, band) becomes an
+-- index range scan reading <= per_band rows, instead of a window pass over
+-- every chunk of every document. Same bands and picks as before:
+-- band_size = max(total / 4, 1), last band runs to the end.
+-- Falls back to COUNT(*) when chunk_count is 0/NULL (rows from before it was kept).
+
+CREATE INDEX IF NOT EXISTS idx_chunks_document_chunk_index
+  ON chunks(document_id, chunk_index);
+
+CREATE OR REPLACE FUNCTION stratified_sample_chunks(
+  filter_user_id uuid,
+  filter_doc_ids uuid[],
+  per_band int DEFAULT 4
+)
+RETURNS TABLE (
+  id uuid,
+  document_id uuid,
+  doc_title text,
+  chunk_index int,
+  page int,
+  content text,
+  band int
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH docs AS (
+    SELECT
+      d.id,
+      d.title,
+      t.ord,
+      COALESCE(
+        NULLIF(d.chunk_count, 0),
+        (SELECT COUNT(*)::int FROM chunks c
+          WHERE c.document_id = d.id AND c.user_id = filter_user_id)
+      ) AS total
+    FROM unnest(filter_doc_ids) WITH ORDINALITY AS t(doc_id, ord)
+    JOIN documents d ON d.id = t.doc_id AND d.user_id = filter_user_id
+  ),
+  bands AS (
+    SELECT
+      docs.id AS doc_id,
+      docs.title,
+      docs.ord,
+      b.band,
+      b.band * GREATEST(docs.total / 4, 1) AS band_start,
+      CASE WHEN b.band < 3
+        THEN (b.band + 1) * GREATEST(docs.total / 4, 1)
+        ELSE docs.total
+      END AS band_end
+    FROM docs
+    CROSS JOIN generate_series(0, 3) AS b(band)
+    WHERE docs.total > 0
+  )
+  SELECT
+    pick.id,
+    pick.document_id,
+    bands.title AS doc_title,
+    pick.chunk_index,
+    pick.page,
+    pick.content,
+    bands.band
+  FROM bands
+  CROSS JOIN LATERAL (
+    SELECT c.id, c.document_id, c.chunk_index, c.page, c.content
+    FROM chunks c
+    WHERE c.document_id = bands.doc_id
+      AND c.user_id = filter_user_id
+      AND c.chunk_index >= bands.band_start
+      AND c.chunk_index < bands.band_end
+    ORDER BY c.chunk_index
+    LIMIT per_band
+  ) pick
+  ORDER BY bands.ord, pick.chunk_index;
+$$;
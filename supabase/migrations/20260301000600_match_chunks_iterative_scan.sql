@@ -0,0 +1,118 @@
+-- match_chunks / match_chunks_batch: HNSW iterative scan + caller-tunable ef_search.
+--
+-- With filter_doc_ids (or a user owning a small share of all chunks), the HNSW
+-- index returns its ef_search nearest candidates and the WHERE filter runs
+-- afterwards — when few of those belong to the requested docs, the query comes
+-- back short even though matching chunks exist. pgvector 0.8's iterative scan
+-- keeps probing the graph until LIMIT rows pass the filter, bounded by
+-- hnsw.max_scan_tuples. strict_order keeps results in exact distance order
+-- (retrieval_service's knee cutoff and per-doc cap rely on it).
+--
+-- ef_search is a parameter (default: pgvector's own 40), applied with
+-- set_config(..., true) so it lasts only for the calling transaction — safe on
+-- the transaction pooler. The two fixed settings are function SET clauses,
+-- restored on exit. plpgsql because a SQL function can't run set_config before
+-- its query; VOLATILE for the same reason.
+-- The argument lists change, so the old signatures must be dropped first.
+
+DROP FUNCTION IF EXISTS match_chunks(vector(1536), uuid, uuid[], float, int);
+DROP FUNCTION IF EXISTS match_chunks_batch(jsonb, uuid, uuid[], float, int);
+
+CREATE OR REPLACE FUNCTION match_chunks(
+  query_embedding vector(1536),
+  filter_user_id uuid,
+  filter_doc_ids uuid[] DEFAULT NULL,
+  match_threshold float DEFAULT 0.5,
+  match_count int DEFAULT 15,
+  ef_search int DEFAULT 40
+)
+RETURNS TABLE (
+  id uuid,
+  document_id uuid,
+  doc_title text,
+  chunk_index int,
+  page int,
+  content text,
+  similarity float
+)
+LANGUAGE plpgsql VOLATILE
+SET hnsw.iterative_scan = 'strict_order'
+SET hnsw.max_scan_tuples = 20000
+AS $$
+BEGIN
+  PERFORM set_config('hnsw.ef_search', ef_search::text, true);
+  RETURN QUERY
+  SELECT
+    c.id,
+    c.document_id,
+    d.title AS doc_title,
+    c.chunk_index,
+    c.page,
+    c.content,
+    1 - (c.embedding <=> query_embedding) AS similarity
+  FROM chunks c
+  JOIN documents d ON d.id = c.document_id
+  WHERE c.user_id = filter_user_id
+    AND (filter_doc_ids IS NULL OR c.document_id = ANY(filter_doc_ids))
+    AND 1 - (c.embedding <=> query_embedding) > match_threshold
+  ORDER BY c.embedding <=> query_embedding ASC
+  LIMIT LEAST(match_count, 200);
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION match_chunks_batch(
+  query_embeddings jsonb,
+  filter_user_id uuid,
+  filter_doc_ids uuid[] DEFAULT NULL,
+  match_threshold float DEFAULT 0.5,
+  match_count int DEFAULT 15,
+  ef_search int DEFAULT 40
+)
+RETURNS TABLE (
+  query_idx int,
+  id uuid,
+  document_id uuid,
+  doc_title text,
+  chunk_index int,
+  page int,
+  content text,
+  similarity float
+)
+LANGUAGE plpgsql VOLATILE
+SET hnsw.iterative_scan = 'strict_order'
+SET hnsw.max_scan_tuples = 20000
+AS $$
+BEGIN
+  PERFORM set_config('hnsw.ef_search', ef_search::text, true);
+  RETURN QUERY
+  SELECT
+    (q.ord - 1)::int AS query_idx,
+    m.id,
+    m.document_id,
+    m.doc_title,
+    m.chunk_index,
+    m.page,
+    m.content,
+    m.similarity
+  FROM jsonb_array_elements(query_embeddings) WITH ORDINALITY AS q(embedding, ord)
+  CROSS JOIN LATERAL (SELECT (q.embedding::text)::vector(1536) AS v) qv
+  CROSS JOIN LATERAL (
+    SELECT
+      c.id,
+      c.document_id,
+      d.title AS doc_title,
+      c.chunk_index,
+      c.page,
+      c.content,
+      1 - (c.embedding <=> qv.v) AS similarity
+    FROM chunks c
+    JOIN documents d ON d.id = c.document_id
+    WHERE c.user_id = filter_user_id
+      AND (filter_doc_ids IS NULL OR c.document_id = ANY(filter_doc_ids))
+      AND 1 - (c.embedding <=> qv.v) > match_threshold
+    ORDER BY c.embedding <=> qv.v ASC
+    LIMIT LEAST(match_count, 200)
+  ) m
+  ORDER BY q.ord, m.similarity DESC;
+END;
+$$;